@@ -4,7 +4,22 @@
 from devices.Clock import Clock
 from devices.Cursor import Cursor
 from devices.Monitor import Monitor
+from devices.Perturbation import scheduleFromTrialData
 from dialog import get_name, get_target_files
+from live_stats import LearningCurveStats
+from telemetry import TelemetryPublisher
+from trajectory_buffer import SharedTrajectoryBuffer
+from trial_types import (STARTING, WAIT_FOR_RT, MOVING_EARLY, FEEDBACK,
+                         FINISHED, TRIAL_TYPES, DEFAULT_TRIAL_TYPE)
+from trajectory_archive import appendTrial, formatTrajectory
+from resample import resampleTrajectory
+from loop_profiler import (LoopProfiler, CLOCK, CURSOR, EVENTS, SAMPLING,
+                           DRAW, MONITOR, STATE)
+from calibrate import loadMachineProfile
+from data_writer import BackgroundWriter
+from gc_control import GCControl
+from path_feedback import PathTrail
+from session_index import getRngState, setRngState, loadSession, saveSession
 
 # Pygame:
 import pygame
@@ -15,22 +30,14 @@ import os
 import sys
 import math
 import random
-import copy
 import pandas as pd
 
-#States:
-STARTING = 0
-WAITING = 1
-WAIT_FOR_RT = 3
-MOVING_EARLY = 4
-MOVING_MIDPOINT = 5
-MOVING = 10
-FEEDBACK = 20
-FINISHED = 99
-
-# Figure out what subject name to use for data saving:
+# Figure out what subject name to use for data saving. Adding --resume
+# picks up an interrupted session after its last completed trial.
+resume_session = '--resume' in sys.argv
+arguments = [arg for arg in sys.argv[1:] if arg != '--resume']
 try:
-    participant_name = sys.argv[1]
+    participant_name = arguments[0]
 except IndexError:
     default = 'Volunteer'
     participant_name = get_name('Participant name (for data saving):', default)
@@ -63,6 +70,13 @@ class Adaptation_Experiment:
 
     # file locations
     dataDir = "Data"
+    # write data files on a background thread so disk speed doesn't
+    # change the gap between trials
+    backgroundWrites = True
+    # 'mvt' writes text trajectories; 'mvz' writes compressed archives
+    # (see trajectory_archive.py) that convert back to identical .mvt text
+    trajectoryFormat = 'mvt'
+    trajectoryCompression = 'zlib' # or 'lzma'; only used for 'mvz'
 
     # onscreen cursor (a circle)
     cursorColor = (128,128,128) # ie, white
@@ -77,7 +91,55 @@ class Adaptation_Experiment:
     feedbackTime = 1 # seconds
 
     sampleRate = 100 # in Hz
+    # if set, trajectories are interpolated onto an exact grid at this
+    # rate (in Hz) before saving; resample.py does the same offline
+    resampleRate = None
     graphicsRate = 120 # in Hz; this is an "upper limit" across a trial
+    eventRate = 30 # in Hz; how often the keyboard is checked during a trial
+    # sampleRate and graphicsRate chosen for this machine by calibrate.py;
+    # used instead of the values above when the file exists
+    machineProfile = 'machine_profile.json'
+
+    # time each phase of the trial loop and write a report per block into
+    # dataDir; cProfileBlocks also runs cProfile over each block (slower)
+    profileLoop = False
+    cProfileBlocks = False
+
+    # keep garbage collection out of the trial loop: disable it during each
+    # trial and collect between trials, timing every pause (written to a
+    # report per block in dataDir; see gc_control.py)
+    controlGC = False
+
+    # show the path of the reach: 'trail' draws it as the cursor moves,
+    # 'path' shows it along with the endpoint feedback, None turns it off
+    pathFeedback = None
+    pathColor = (255,255,255) # white
+    pathWidth = 2 # pixels
+    pathMinStep = 3 # pixels; samples closer together than this are skipped
+
+    # read the mouse straight from a Linux evdev device (e.g.
+    # '/dev/input/event5', or 'auto' for the first mouse) instead of through
+    # pygame; see devices/UseEvdev.py. Trajectories then get a 7th column:
+    # the trial time of the kernel's report the sample's position came
+    # from (-1 if there hasn't been one yet).
+    evdevDevice = None
+
+    # trajectory rows set up in advance per trial, so the loop only fills
+    # them in; longer trials still work, they just allocate as they go
+    trajectoryCapacity = 20 # seconds
+
+    # print running learning-curve statistics to the terminal after each
+    # trial (for the experimenter; the participant never sees these)
+    showLiveStats = False
+    liveStatsWindow = 10 # trials
+
+    # stream samples and trial summaries over UDP to a (host, port);
+    # None turns telemetry off. See telemetry.py for a receiver.
+    telemetryAddress = None
+
+    # place the current trajectory in a shared memory ring buffer with this
+    # name (see trajectory_buffer.py for readers); None turns it off.
+    sharedBufferName = None
 
     # I'm going to store data into a Python dictionary to make this code 
     # readable. The keys in Python dictionaries are not sorted in any 
@@ -111,6 +173,8 @@ class Adaptation_Experiment:
         'feedbackX',
         'feedbackY',
         'feedbackAngle',
+        'chosenAngle',
+        'targetShown',
         ]
 
     # Anything that is added outside this list will be appended at the end 
@@ -122,10 +186,30 @@ class Adaptation_Experiment:
     blockRunning = False
 
 
-    def __init__(self, subname):
+    def __init__(self, subname, resume=False):
+
+        self.subName = subname
+        self.curBlock = 0
+        # index of the first trial to run in the next block:
+        self.resumeTrial = 0
 
         # Figure out the blocks to run:
-        self.block_list = get_target_files()
+        session = None
+        if resume:
+            session = loadSession(self.sessionFileName())
+        if session:
+            self.resumeSession(session)
+        else:
+            self.block_list = get_target_files()
+
+        profile = loadMachineProfile(self.machineProfile)
+        if profile:
+            # (no sampleRate if calibration couldn't measure the mouse,
+            # and no graphicsRate if it couldn't measure the display)
+            if profile.get('sampleRate'):
+                self.sampleRate = profile['sampleRate']
+            if profile.get('graphicsRate'):
+                self.graphicsRate = profile['graphicsRate']
 
         # Initialize data dictionary:
         self.defaultTrialDict = {}
@@ -136,11 +220,66 @@ class Adaptation_Experiment:
 
         self.centerX = self.width/2
         self.centerY = self.height/2
-
-        self.cursor = Cursor((self.centerX,self.centerY))
-        self.timer = Clock(5)
-        self.subName = subname
-        self.curBlock = 0
+        self.centerPos = (self.centerX, self.centerY)
+
+        if self.evdevDevice:
+            # (Linux only, so only imported when asked for)
+            from devices.UseEvdev import MotionHardware as EvdevHardware
+            hardware = EvdevHardware(
+                self.centerX, self.centerY,
+                None if self.evdevDevice == 'auto' else self.evdevDevice
+                )
+        else:
+            hardware = None
+        self.cursor = Cursor((self.centerX,self.centerY), hardware=hardware)
+        if self.evdevDevice:
+            self.trajectoryColumns = 7
+        else:
+            self.trajectoryColumns = 6
+
+        # Only queue the events we act on; mouse motion is read through
+        # pygame.mouse, so there's no need to queue every MOUSEMOTION.
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([KEYDOWN, QUIT])
+        # Keys handled during a block:
+        self.keyBindings = {
+            K_ESCAPE: self.abortBlock,
+            K_END: self.abortExperiment,
+            }
+        # timers: 0 session, 1 trial, 2 state, 3 graphics, 4 sampling,
+        # 5 keyboard
+        self.timer = Clock(6)
+
+        # running statistics, fed one trial at a time:
+        self.liveStats = LearningCurveStats(self.liveStatsWindow)
+        if self.backgroundWrites:
+            self.writer = BackgroundWriter()
+        else:
+            self.writer = None
+        # the next trial, set up during the current trial's feedback:
+        self.preparedTrial = None
+        if self.profileLoop or self.cProfileBlocks:
+            self.profiler = LoopProfiler()
+        else:
+            self.profiler = None
+        if self.controlGC:
+            self.gcControl = GCControl()
+        else:
+            self.gcControl = None
+        if self.pathFeedback:
+            self.pathTrail = PathTrail(
+                self.screen, self.pathColor, self.pathWidth, self.pathMinStep
+                )
+        else:
+            self.pathTrail = None
+        if self.telemetryAddress:
+            self.telemetry = TelemetryPublisher(self.telemetryAddress)
+        else:
+            self.telemetry = None
+        if self.sharedBufferName:
+            self.sharedBuffer = SharedTrajectoryBuffer(self.sharedBufferName)
+        else:
+            self.sharedBuffer = None
 
         # graphics flags:
         self.cursorOn = False
@@ -148,20 +287,58 @@ class Adaptation_Experiment:
         self.targetOn = False
         self.fixOn = False
         self.feedbackOn = False
+        # trial time (timer 1) the movement started, None before then:
+        self.movementOnset = None
+        # the trial's own target is drawn unless its trial type says not:
+        self.showTarget = True
+        # extra objects shown with the target, as (color, (x, y), radius):
+        self.trialObjects = []
+
+        # Everything set up so far lasts the whole session:
+        if self.gcControl:
+            self.gcControl.freezeStartup()
 
 
     def update(self):
+        profiler = self.profiler
         # check the clock and cursor:
         self.timer.update()
-        self.cursor.update()
+        if profiler:
+            profiler.lap(CLOCK)
+        # perturbation schedules run on time since movement onset:
+        if self.movementOnset is None:
+            self.cursor.update(0.0)
+        else:
+            self.cursor.update(self.timer[1] - self.movementOnset)
+        if profiler:
+            profiler.lap(CURSOR)
 
-        # check keyboard events for quit signal:
+        # Nobody presses keys at 1 kHz, so check the keyboard at a bounded
+        # rate rather than on every pass through the loop:
+        if self.timer[5] >= 1.0/self.eventRate:
+            self.timer.reset(5)
+            self.handleEvents()
+        if profiler:
+            profiler.lap(EVENTS)
+
+
+    def handleEvents(self):
+        # dispatch queued key presses through the key binding table
         for event in pygame.event.get():
             if event.type == KEYDOWN:
-                if event.key == K_ESCAPE:
-                    self.quitBlock = True
-                elif event.key == K_END:
-                    self.quitExperiment = True    
+                action = self.keyBindings.get(event.key)
+                if action:
+                    action()
+            elif event.type == QUIT:
+                self.abortExperiment()
+
+
+    def abortBlock(self):
+        self.quitBlock = True
+
+
+    def abortExperiment(self):
+        self.quitExperiment = True
 
 
     def pol2rect(self, r, theta_deg):
@@ -213,11 +390,16 @@ class Adaptation_Experiment:
         """Routine to update graphics
         """
         self.screen.blankRects()
+        # the path goes underneath everything else:
+        if self.pathTrail:
+            if self.feedbackOn and not(self.pathTrail.visible):
+                self.pathTrail.show()
+            self.pathTrail.draw()
         # draw the "fixation" spot in the center:
         if self.fixOn:
-            current_dist = distance(
-                (self.cursor.DisplayX, self.cursor.DisplayY),
-                (self.centerX, self.centerY)
+            current_dist = math.hypot(
+                self.cursor.DisplayX - self.centerX,
+                self.cursor.DisplayY - self.centerY
             )
             if current_dist < self.fixRad and not(self.targetOn):
                 fixColor = (0,0,255)
@@ -225,7 +407,7 @@ class Adaptation_Experiment:
                 fixColor = (255,255,0)
             self.screen.drawFix(
                 fixColor,
-                (self.centerX, self.centerY),
+                self.centerPos,
                 self.fixRad,
                 self.fixWidth
             )
@@ -246,15 +428,18 @@ class Adaptation_Experiment:
             )
         # target
         if self.targetOn:
-            self.screen.drawCircle(
-                self.targetColor,
-                (
-                    self.thisTrial['targetX'] + self.thisTrial['startX'],
-                    self.thisTrial['targetY'] + self.thisTrial['startY']
-                ),
-                self.targetRadius,
-                0
-            )
+            if self.showTarget:
+                self.screen.drawCircle(
+                    self.targetColor,
+                    (
+                        self.thisTrial['targetX'] + self.thisTrial['startX'],
+                        self.thisTrial['targetY'] + self.thisTrial['startY']
+                    ),
+                    self.targetRadius,
+                    0
+                )
+            for (color, position, radius) in self.trialObjects:
+                self.screen.drawCircle(color, position, radius, 0)
         # feedback of final position
         if (self.feedbackOn):
             self.screen.drawCircle(
@@ -266,7 +451,11 @@ class Adaptation_Experiment:
                 self.cursorRad,
                 0
             )
+        if self.profiler:
+            self.profiler.lap(DRAW)
         self.screen.update()
+        if self.profiler:
+            self.profiler.lap(MONITOR)
 
 
     def writeAna(self,dataDict):
@@ -305,46 +494,158 @@ class Adaptation_Experiment:
 
     def writeTrajectory(self,dataList,header = 'Trial:\n'):
         # Writes one trial at a time; trials could be rather long
-        dataFile = open(
-            os.path.join(
-                self.dataDir,
-                self.subName + '_' + str(self.curBlock).zfill(2) + '.mvt'
-                ),
-            'a'
+        fileName = os.path.join(
+            self.dataDir,
+            self.subName + '_' + str(self.curBlock).zfill(2) + '.' +
+            self.trajectoryFormat
             )
-        if not('\n' in header):
-            header = header + '\n'
-        dataFile.write(header)
-        for datum in dataList:
-            try:
-                for column in datum:
-                    dataFile.write(str(column) + '\t')
-            except:
-                dataFile.write(str(datum))
-            dataFile.write('\n')
-        dataFile.write('\n')
+        if self.resampleRate:
+            # (the report time column is held like the state, not
+            # interpolated between reports and the -1 before the first)
+            holdColumns = (1, 6) if self.trajectoryColumns == 7 else (1,)
+            dataList = resampleTrajectory(
+                dataList, self.resampleRate, holdColumns=holdColumns
+                )
+        if self.trajectoryFormat == 'mvz':
+            appendTrial(
+                fileName, dataList, header, self.trajectoryCompression
+                )
+            return
+        dataFile = open(fileName, 'a')
+        dataFile.write(formatTrajectory(dataList, header))
         dataFile.close()
 
 
-    def randomTarget(self, target_distance = None):
+    def randomTarget(self, target_distance = None, trial = None):
 
         if not(target_distance):
             # This allows for some flexibility later;
             # not really necessary right now, though
             target_distance = self.targetDistance 
+        if trial is None:
+            trial = self.thisTrial
 
         # Pick the target at random, and set all necessary positions:
-        self.thisTrial['targetAngle'] = \
+        trial['targetAngle'] = \
             random.choice(range(self.numTargets)) * (360.0/self.numTargets)
-        self.thisTrial['targetDistance'] = target_distance
-        (self.thisTrial['targetX'], self.thisTrial['targetY']) = \
+        trial['targetDistance'] = target_distance
+        (trial['targetX'], trial['targetY']) = \
             self.pol2rect(
-                self.thisTrial['targetDistance'],
-                self.thisTrial['targetAngle']
+                trial['targetDistance'],
+                trial['targetAngle']
             )
 
 
-    def runTrial(self, trial_number, trial_data):
+    def sessionFileName(self):
+        return os.path.join(self.dataDir, self.subName + '.session')
+
+
+    def resumeSession(self, session):
+        # Carry on after the last trial recorded in the session index
+        self.block_list = session['blockList']
+        if session['trial'] + 1 < session['numTrials']:
+            # Part-way through a block; run() will re-enter it.
+            self.curBlock = session['block'] - 1
+            self.resumeTrial = session['trial'] + 1
+        else:
+            self.curBlock = session['block']
+        setRngState(session['rngState'])
+
+
+    def recordProgress(self, trial_number, num_trials, rng_state):
+        # Update the session index (after the trial's data, if queued)
+        args = (self.sessionFileName(), self.block_list, self.curBlock,
+                trial_number, num_trials, rng_state)
+        if self.writer:
+            self.writer.put(saveSession, *args)
+        else:
+            saveSession(*args)
+
+
+    def prepareTrial(self, trial_number, trial_data):
+        """Set up everything a trial needs before it starts
+
+        This is kept apart from runTrial so the next trial can be set up
+        while the current one shows feedback.
+
+        Parameters
+        ----------
+        trial_number, trial_data :
+            As for runTrial.
+
+        Returns
+        -------
+        prepared : dict
+            The trial's data dictionary ('trial'), its state machine tables
+            ('transitions', 'entry'), whether its target is drawn
+            ('showTarget'), extra display objects ('objects'),
+            cursor perturbation schedule ('perturbation'), the random
+            number generator state it started from ('rngState') and empty
+            trajectory rows for runTrial to fill in ('rows').
+        """
+        # Resuming from here needs the generator as it was before any
+        # random choices for this trial:
+        rng_state = getRngState()
+        # Values in the default dictionary are all plain numbers, so a
+        # shallow copy is enough.
+        trial = dict(self.defaultTrialDict)
+        if 'rotation' in trial_data:
+            trial['rotation'] = trial_data['rotation']
+        else:
+            trial['rotation'] = 0
+        # count from 1 to make data more human-readable
+        trial['trialNumber'] = trial_number + 1
+        trial['blockNumber'] = self.curBlock
+
+        if 'target_angle' in trial_data:
+            trial['targetAngle'] = trial_data['target_angle']
+            if 'target_distance' in trial_data:
+                trial['targetDistance'] = trial_data['target_distance']
+            else:
+                trial['targetDistance'] = self.targetDistance
+            trial['targetX'], trial['targetY'] = \
+                self.pol2rect(trial['targetDistance'], trial['targetAngle'])
+        elif 'target_x' in trial_data:
+            trial['targetX'] = trial_data['target_x']
+            trial['targetY'] = trial_data['target_y']
+            # target_x/target_y are screen coordinates, like the ones
+            # pol2rect gives; rect2pol wants them relative to the center
+            # and returns (r, theta):
+            trial['targetDistance'], trial['targetAngle'] = self.rect2pol(
+                trial['targetX'] - self.centerX,
+                trial['targetY'] - self.centerY
+                )
+        else:
+            # If no target is defined, then pick one at random:
+            self.randomTarget(trial = trial)
+
+        trial_type = trial_data.get('trial_type', DEFAULT_TRIAL_TYPE)
+        if not isinstance(trial_type, str):
+            # empty cells in the target file come through as NaN
+            trial_type = DEFAULT_TRIAL_TYPE
+        objects = []
+        trial_kind = TRIAL_TYPES[trial_type]
+        transitions, entry = trial_kind.build(self, trial, objects)
+        # (0 for choice trials: the stats then score chosenAngle instead)
+        trial['targetShown'] = int(trial_kind.showTarget)
+
+        return {
+            'trial': trial,
+            'transitions': transitions,
+            'entry': entry,
+            'showTarget': trial_kind.showTarget,
+            'objects': objects,
+            'perturbation': scheduleFromTrialData(
+                trial_data, trial['rotation'], trial['targetAngle']
+                ),
+            'rngState': rng_state,
+            'rows': [[0.0] * self.trajectoryColumns for i in
+                     range(int(self.trajectoryCapacity * self.sampleRate))],
+            }
+
+
+    def runTrial(self, trial_number, trial_data, prepared=None,
+                 next_trial=None):
         """Run a single trial
 
         Parameters
@@ -362,9 +663,19 @@ class Adaptation_Experiment:
                     The distance of the target, in pixels. If not supplied, defaults to the set distance.
                 target_x, target_y - numeric (optional)
                     The x- and y-coordinates of the target. Ignored if target_angle is set.
+                trial_type - string (optional)
+                    Which state machine to run (a key of trial_types.TRIAL_TYPES). Defaults to 'center_out'.
+                ramp_rotation, ramp_length, ramp_by, ramp_start, clamp_offset, noise_sd, noise_interval (optional)
+                    Within-trial perturbations; see devices.Perturbation.scheduleFromTrialData.
 
             NOTE: If no target information is supplied, a target will be selected at random.
 
+        prepared : dict (optional)
+            This trial as already set up by prepareTrial. If not supplied, it's set up now.
+
+        next_trial : (trial_number, trial_data) (optional)
+            The trial to run after this one. It is set up during this trial's feedback and left in self.preparedTrial.
+
         Returns
         -------
         ana_dict : dict
@@ -373,44 +684,21 @@ class Adaptation_Experiment:
         trajectory : list
             A list of values that make up the full trajectory. Each row is a single sample.
         """
-        # Coded as a functional example of a "slicing" movement
-        self.thisTrial = copy.deepcopy(self.defaultTrialDict)
-        if 'rotation' in trial_data:
-            self.thisTrial['rotation'] = trial_data['rotation']
-        else:
-            self.thisTrial['rotation'] = 0
-        # count from 1 to make data more human-readable
-        self.thisTrial['trialNumber'] = trial_number + 1
-        self.thisTrial['blockNumber'] = self.curBlock
+        if prepared is None:
+            prepared = self.prepareTrial(trial_number, trial_data)
+        self.thisTrial = prepared['trial']
         self.thisTrial['startTime'] = self.timer[0]
-
-        # May want to remove this later if trials are to be scripted:
-        #self.randomTarget()
-        if 'target_angle' in trial_data:
-            self.thisTrial['targetAngle'] = trial_data['target_angle']
-            if 'target_distance' in trial_data:
-                self.thisTrial['targetDistance'] = trial_data['target_distance']
-            else:
-                self.thisTrial['targetDistance'] = self.targetDistance
-            self.thisTrial['targetX'], self.thisTrial['targetY'] = \
-                self.pol2rect(
-                    self.thisTrial['targetDistance'],
-                    self.thisTrial['targetAngle']
-                )
-        elif 'target_x' in trial_data:
-            self.thisTrial['targetX'] = trial_data['target_x']
-            self.thisTrial['targetY'] = trial_data['target_y']
-            self.thisTrial['targetAngle'], self.thisTrial['targetDistance'] = \
-                self.rect2pol(
-                    self.thisTrial['targetX'], self.thisTrial['targetY']
-                    )
-        else:
-            # If no target is defined, then pick one at random:
-            self.randomTarget()
+        transitions = prepared['transitions']
+        entry = prepared['entry']
+        self.showTarget = prepared['showTarget']
+        self.trialObjects = prepared['objects']
 
         trialOver = False
-        traj = []
+        traj = prepared['rows']
+        samples = 0
+        reportTimes = self.trajectoryColumns == 7
         state = STARTING
+        condition, nextState = transitions[state]
 
         # Initialize graphics flags:
         self.cursorOn = True
@@ -419,7 +707,20 @@ class Adaptation_Experiment:
         self.feedbackOn = False
         self.cueOn = False
         self.cursor.setRotation(self.thisTrial['rotation'])
-
+        self.cursor.setPerturbation(prepared['perturbation'])
+        if self.sharedBuffer:
+            self.sharedBuffer.startTrial(self.thisTrial['trialNumber'])
+
+        profiler = self.profiler
+        if profiler:
+            profiler.start()
+        if self.gcControl:
+            self.gcControl.startTrial()
+        pathTrail = self.pathTrail
+        if pathTrail and self.pathFeedback == 'trail':
+            pathTrail.show()
+
+        self.movementOnset = None
         self.timer.reset(1)
         while not(trialOver) \
             and not(self.quitBlock) \
@@ -428,11 +729,45 @@ class Adaptation_Experiment:
 
             # Save data at a fixed rate (keeps datafile sane)
             if self.timer[4] >= 1.0/self.sampleRate:
-                traj.append([self.timer[1], state, 
-                             self.cursor.CurrentX, self.cursor.CurrentY, 
-                             self.cursor.DisplayX, self.cursor.DisplayY])
-                # Rather than resetting timer 4, I want to allow jitter:
-                self.timer[4] = self.timer[4] - 1.0/self.sampleRate
+                # fill in the next preallocated row:
+                if samples < len(traj):
+                    row = traj[samples]
+                else:
+                    row = [0.0] * self.trajectoryColumns
+                    traj.append(row)
+                row[0] = self.timer[1]
+                row[1] = state
+                row[2] = self.cursor.CurrentX
+                row[3] = self.cursor.CurrentY
+                row[4] = self.cursor.DisplayX
+                row[5] = self.cursor.DisplayY
+                if reportTimes:
+                    # hardware times are on Clock.lastTime's scale:
+                    reportTime = self.cursor.hardware.lastTime
+                    if reportTime is None:
+                        row[6] = -1
+                    else:
+                        row[6] = self.timer[1] - \
+                            (self.timer.lastTime - reportTime)
+                samples += 1
+                # the path runs from the go cue to the end of the reach:
+                if pathTrail and WAIT_FOR_RT <= state < FEEDBACK:
+                    pathTrail.addPoint(row[4], row[5])
+                if self.telemetry:
+                    self.telemetry.publishSample(
+                        row[0], row[1], row[2], row[3], row[4], row[5]
+                        )
+                if self.sharedBuffer:
+                    self.sharedBuffer.write(
+                        row[0], row[1], row[2], row[3], row[4], row[5]
+                        )
+                # Rather than resetting timer 4, I want to allow jitter.
+                # But if the loop stalled for several periods, drop the
+                # backlog rather than recording a burst of samples; the
+                # timestamps show the gap.
+                self.timer[4] = self.timer[4] % (1.0/self.sampleRate)
+            if profiler:
+                profiler.lap(SAMPLING)
 
             # Update graphics at a fixed rate (avoids overhead)
             if self.timer[3] >= 1.0/self.graphicsRate:
@@ -440,66 +775,93 @@ class Adaptation_Experiment:
                 # Rather than resetting timer 3, I want to allow jitter:
                 self.timer[3] = self.timer[3] - 1.0/self.graphicsRate
             ################################################################
-            # Trial state machine:
-            if state == STARTING:
-                # wait for the cursor to be in the fixation spot:
-                if self.cursor.VisualDisplacement < self.fixRad:
-                    self.timer.reset(2)
-                    state = WAITING
-            elif state == WAITING:
-                # wait an appropriate amount of time in the fixation spot
-                if self.timer[2] >= self.holdTime:
-                    self.timer.reset(2)
-                    self.targetOn = True
-                    state = WAIT_FOR_RT
-            elif state == WAIT_FOR_RT:
-                # wait for subject to start moving
-                if self.cursor.VisualDisplacement < self.fixRad:
-                    self.thisTrial['reactionTime'] = self.timer[2]
-                    self.timer.reset(2)
-                    state = MOVING_EARLY
-            elif state == MOVING_EARLY:
-                # wait for the cursor to cross 1/4 of target distance,
-                # save position
-                if self.cursor.VisualDisplacement >= self.targetDistance / 4.0:
-                    self.thisTrial['earlyTime'] = self.timer[2]
-                    self.thisTrial['earlyX'] = self.cursor.CurrentX
-                    self.thisTrial['earlyY'] = self.cursor.CurrentY
-                    self.thisTrial['earlyAngle'] = \
-                        math.atan2(self.cursor.CurrentY, self.cursor.CurrentX)
-                    state = MOVING_MIDPOINT
-            elif state == MOVING_MIDPOINT:
-                # wait for the cursor to cross 1/2 of target distance,
-                # save position
-                if self.cursor.VisualDisplacement >= self.targetDistance / 2.0:
-                    self.thisTrial['midpointTime'] = self.timer[2]
-                    self.thisTrial['midpointX'] = self.cursor.CurrentX
-                    self.thisTrial['midpointY'] = self.cursor.CurrentY
-                    self.thisTrial['midpointAngle'] = \
-                        math.atan2(self.cursor.CurrentY, self.cursor.CurrentX)
-                    state = MOVING
-            elif state == MOVING:
-                # wait for the cursor to cross target distance, save position
-                if self.cursor.VisualDisplacement >= self.targetDistance:
-                    self.thisTrial['movementTime'] = self.timer[2]
-                    self.thisTrial['finalX'] = self.cursor.CurrentX
-                    self.thisTrial['finalY'] = self.cursor.CurrentY
-                    self.thisTrial['finalAngle'] = \
-                        math.atan2(self.cursor.CurrentY, self.cursor.CurrentX)
-                    self.thisTrial['feedbackX'] = self.cursor.DisplayX
-                    self.thisTrial['feedbackY'] = self.cursor.DisplayY
-                    state = FEEDBACK
-                    self.timer.reset(2)
-                    self.feedbackOn = True
-            elif state == FEEDBACK:
-                if self.timer[2] >= self.feedbackTime:
-                    state = FINISHED
+            # Trial state machine (see trial_types.py):
+            if condition():
+                state = nextState
+                entry[state]()
+                if state == MOVING_EARLY:
+                    self.movementOnset = self.timer[1]
+                if state == FINISHED:
                     trialOver = True
-
+                else:
+                    condition, nextState = transitions[state]
+                    if state == FEEDBACK and next_trial is not None:
+                        # Nothing left to do but wait, so use the time
+                        # to set up the next trial:
+                        try:
+                            self.preparedTrial = \
+                                self.prepareTrial(*next_trial)
+                        except Exception:
+                            # Don't lose this trial over it; runBlock sets
+                            # the next one up again after saving this one.
+                            self.preparedTrial = None
+                        next_trial = None
+            if profiler:
+                profiler.lap(STATE)
+
+        if self.gcControl:
+            self.gcControl.endTrial()
+        if pathTrail:
+            pathTrail.clear()
+        # drop the rows that weren't needed:
+        del traj[samples:]
         return [self.thisTrial, traj]
 
 
-    def runBlock(self, target_file):
+    def reportTrial(self, trial_data):
+        # Incremental statistics; never rereads the datafiles
+        self.liveStats.addTrial(trial_data)
+        if self.showLiveStats:
+            self.liveStats.printSummary()
+        if self.telemetry:
+            self.telemetry.publishTrial(trial_data)
+
+
+    def saveTrial(self, ana_data, trajectory_data, header):
+        # Write out data after every trial to avoid losing data.
+        if self.writer:
+            self.writer.put(self.writeAna, ana_data)
+            self.writer.put(self.writeTrajectory, trajectory_data, header)
+        else:
+            self.writeAna(ana_data)
+            self.writeTrajectory(trajectory_data, header)
+
+
+    def finishBlock(self):
+        # Make sure everything from this block is on disk
+        if self.writer:
+            self.writer.flush()
+        self.finishProfile()
+        if self.gcControl:
+            fileName = os.path.join(
+                self.dataDir,
+                self.subName + '_' + str(self.curBlock).zfill(2) + '_gc.txt'
+                )
+            with open(fileName, 'w') as reportFile:
+                reportFile.write(self.gcControl.report())
+            self.gcControl.reset()
+        self.screen.blank()
+
+
+    def startProfile(self):
+        if self.profiler:
+            self.profiler.reset()
+            if self.cProfileBlocks:
+                self.profiler.startCProfile()
+
+
+    def finishProfile(self):
+        # Per-block report, next to the .ana file
+        if self.profiler:
+            self.profiler.stopCProfile()
+            self.profiler.writeReport(os.path.join(
+                self.dataDir,
+                self.subName + '_' + str(self.curBlock).zfill(2) +
+                '_profile.txt'
+                ))
+
+
+    def runBlock(self, target_file, first_trial=0):
         """Run a block
 
         Parameters
@@ -507,7 +869,11 @@ class Adaptation_Experiment:
         target_file : string
             The path to a target file. This is expected to be a comma separated file with one line for each trial.
             When all trials have been run, the block will be considered done.
+
+        first_trial : int (optional)
+            Index of the trial to start from, when resuming a block. Default is 0.
         """
+        self.quitBlock = False
         try:
             all_trials = pd.read_csv(target_file)
         except:
@@ -517,17 +883,92 @@ class Adaptation_Experiment:
             #self.runBlockDemo()
             return
 
-        for trial_number in range(all_trials.shape[0]):
+        trial_list = all_trials.to_dict('records')
+        problems = self.checkTrials(trial_list)
+        if problems:
+            # Better to stop now than part-way through the block:
+            print("Something is wrong with the input target file...")
+            for problem in problems:
+                print('  ' + problem)
+            return
+        self.startProfile()
+        prepared = None
+        for trial_number in range(first_trial, len(trial_list)):
+            if trial_number + 1 < len(trial_list):
+                next_trial = (trial_number + 1, trial_list[trial_number + 1])
+            else:
+                next_trial = None
+            self.preparedTrial = None
             [ana_data, trajectory_data] = self.runTrial(
-                trial_number, dict(all_trials.iloc[trial_number, :])
+                trial_number, trial_list[trial_number], prepared, next_trial
+                )
+            prepared = self.preparedTrial
+            # writeAna empties the dict, so update statistics first:
+            self.reportTrial(ana_data)
+            self.saveTrial(ana_data, trajectory_data, 'Trial %i:' % (trial_number))
+            if self.gcControl:
+                self.gcControl.collect()
+            # An aborted trial has still been saved, so it counts too
+            # (resuming mustn't write it again). If the block was
+            # abandoned, so is the rest of it, as when running normally.
+            self.recordProgress(
+                len(trial_list) - 1 if self.quitBlock else trial_number,
+                len(trial_list),
+                prepared['rngState'] if prepared else getRngState()
                 )
-            # Write out data after every trial to avoid losing data.
-            self.writeAna(ana_data)
-            self.writeTrajectory(trajectory_data, 'Trial %i:' % (trial_number))
             if self.quitExperiment or self.quitBlock:
                 break
 
-        self.screen.blank()
+        self.finishBlock()
+
+
+    def checkTrials(self, trial_list):
+        """Check target file rows before running any of them
+
+        Parameters
+        ----------
+        trial_list : list of dict
+            The target file's rows, as runBlock reads them.
+
+        Returns
+        -------
+        problems : list of strings
+            One message per problem found (empty if there are none).
+        """
+        numeric = ['rotation', 'target_angle', 'target_distance', 'target_x',
+                   'target_y', 'ramp_rotation', 'ramp_length', 'ramp_start',
+                   'clamp_offset', 'noise_sd', 'noise_interval']
+        problems = []
+        for trial_number, trial_data in enumerate(trial_list):
+            # row numbers as in a spreadsheet (the header is row 1):
+            row = 'row %i: ' % (trial_number + 2)
+            for key in numeric:
+                value = trial_data.get(key)
+                # (one bad cell makes pandas read the whole column as text)
+                if isinstance(value, str):
+                    try:
+                        float(value)
+                    except ValueError:
+                        problems.append(
+                            row + '%s is not a number (%r)' % (key, value)
+                            )
+            trial_type = trial_data.get('trial_type')
+            if isinstance(trial_type, str) and trial_type not in TRIAL_TYPES:
+                problems.append(
+                    row + 'unknown trial_type %r (expected one of %s)' %
+                    (trial_type, ', '.join(sorted(TRIAL_TYPES)))
+                    )
+            ramp_by = trial_data.get('ramp_by')
+            if isinstance(ramp_by, str) and \
+                    ramp_by not in ('time', 'distance'):
+                problems.append(
+                    row + "ramp_by must be 'time' or 'distance' (not %r)" %
+                    ramp_by
+                    )
+            if 'target_angle' not in trial_data and \
+                    ('target_x' in trial_data) != ('target_y' in trial_data):
+                problems.append(row + 'target_x and target_y go together')
+        return problems
 
 
     def runBlockDemo(self, num_trials=24):
@@ -538,16 +979,29 @@ class Adaptation_Experiment:
         else:
             rotation = 0
 
+        self.quitBlock = False
+        self.startProfile()
+        prepared = None
         for trial_number in range(num_trials):
-            [trial_data, traj] = self.runTrial(trial_number, {'rotation':rotation})
+            if trial_number + 1 < num_trials:
+                next_trial = (trial_number + 1, {'rotation':rotation})
+            else:
+                next_trial = None
+            self.preparedTrial = None
+            [trial_data, traj] = self.runTrial(
+                trial_number, {'rotation':rotation}, prepared, next_trial
+                )
+            prepared = self.preparedTrial
             # write the trajectory information after every trial to
             # keep memory cost low
-            self.writeAna(trial_data)
-            self.writeTrajectory(traj, 'Trial ' + str(trial_number) + ':')
+            self.reportTrial(trial_data)
+            self.saveTrial(trial_data, traj, 'Trial ' + str(trial_number) + ':')
+            if self.gcControl:
+                self.gcControl.collect()
             if self.quitExperiment or self.quitBlock:
                 break
 
-        self.screen.blank()
+        self.finishBlock()
 
     def run(self):
 
@@ -579,7 +1033,9 @@ class Adaptation_Experiment:
                     elif event.key == K_SPACE:
                         target_file = self.block_list[self.curBlock]
                         self.curBlock += 1
-                        self.runBlock(target_file)
+                        first_trial = self.resumeTrial
+                        self.resumeTrial = 0
+                        self.runBlock(target_file, first_trial)
 
 
             if self.curBlock >= len(self.block_list):
@@ -600,9 +1056,18 @@ class Adaptation_Experiment:
                     self.timer.update()
                 self.quitExperiment = True
 
+        if self.writer:
+            self.writer.close()
+        if self.telemetry:
+            self.telemetry.close()
+        if self.sharedBuffer:
+            self.sharedBuffer.close()
+        if self.gcControl:
+            self.gcControl.close()
+        self.cursor.hardware.close()
         self.screen.close()
 
 
 if __name__ == "__main__":
-    Adaptation_Experiment(participant_name).run()
+    Adaptation_Experiment(participant_name, resume_session).run()
 
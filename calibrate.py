@@ -0,0 +1,245 @@
+# Measure what this machine can sustain and pick sampleRate/graphicsRate.
+#
+# python calibrate.py [profile file] [--evdev device]
+#
+# Opens the experiment screen, then measures:
+#   - the resolution and cost of Clock.update
+#   - the cost of one pass through the trial loop (everything runTrial
+#     does on each pass except drawing) with the hardware backend the
+#     experiment will use (pygame's mouse, or the evdev device given with
+#     --evdev, as for Adaptation_Experiment.evdevDevice)
+#   - how often that backend reports new positions (move the mouse
+#     around continuously while this runs)
+#   - the cost of drawing a typical frame (what drawGraphics draws)
+#   - the display refresh interval (time per flip, with vsync on; if the
+#     display can't be opened with vsync, it's recorded as unknown)
+# and writes the results, plus recommended rates, to a machine profile
+# (machine_profile.json by default). Adaptation_Experiment loads that file
+# at startup if it exists.
+import json
+import os
+import platform
+import socket
+import sys
+
+import pygame
+
+from devices.Clock import Clock
+from devices.Cursor import Cursor
+from devices.Monitor import Monitor
+
+DEFAULT_PROFILE = 'machine_profile.json'
+
+# Rates we're willing to pick, fastest first:
+SAMPLE_RATES = [1000, 500, 250, 200, 125, 100, 60, 50]
+GRAPHICS_RATES = [240, 165, 144, 120, 100, 85, 75, 60, 50, 30]
+
+
+def median(values):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[len(values) // 2]
+
+
+def measureClock(timer, duration=0.5):
+    """Smallest step and average cost of Clock.update"""
+    steps = []
+    timer.resetAll()
+    calls = 0
+    while timer[0] < duration:
+        timer.update()
+        calls += 1
+        if timer.dt > 0:
+            steps.append(timer.dt)
+    return min(steps) if steps else 0.0, duration / calls
+
+
+def measureLoop(timer, cursor, duration=1.0, eventRate=30):
+    """Average time for one pass of the trial loop, without drawing
+
+    Each pass does what runTrial does on every pass: update the clock and
+    cursor (so the hardware backend too), check the keyboard now and
+    then, record a trajectory sample and test the state's condition.
+    Samples are recorded on every pass, the worst case.
+    """
+    row = [0.0] * 6
+    threshold = 1e9
+    timer.resetAll()
+    passes = 0
+    lastEvents = 0.0
+    while timer[0] < duration:
+        timer.update()
+        cursor.update(timer[1])
+        if timer[0] - lastEvents >= 1.0 / eventRate:
+            lastEvents = timer[0]
+            pygame.event.get()
+        row[0] = timer[1]
+        row[1] = 0
+        row[2] = cursor.CurrentX
+        row[3] = cursor.CurrentY
+        row[4] = cursor.DisplayX
+        row[5] = cursor.DisplayY
+        if cursor.VisualDisplacement >= threshold:
+            break
+        passes += 1
+    return duration / passes
+
+
+def measureMouse(timer, hardware, duration=3.0):
+    """How many times per second new positions come in"""
+    timer.resetAll()
+    lastX = hardware.getRelX()
+    lastY = hardware.getRelY()
+    reports = []
+    while timer[0] < duration:
+        timer.update()
+        hardware.Update()
+        x = hardware.getRelX()
+        y = hardware.getRelY()
+        if x != lastX or y != lastY:
+            reports.append(timer[0])
+            lastX, lastY = x, y
+    if len(reports) < 2:
+        return 0.0
+    intervals = [b - a for a, b in zip(reports, reports[1:])]
+    # The median ignores the pauses when the mouse wasn't moving:
+    return 1.0 / median(intervals) if median(intervals) > 0 else 0.0
+
+
+def measureDraw(timer, screen, width, height, frames=200):
+    """Average time to draw and update a typical frame"""
+    centerX, centerY = width / 2, height / 2
+    timer.resetAll()
+    for i in range(frames):
+        screen.blankRects()
+        screen.drawFix((255, 255, 0), (centerX, centerY), 15, 2)
+        screen.drawCircle((128, 128, 128), (centerX + i % 200, centerY), 5)
+        screen.drawCircle((128, 128, 0), (centerX + 200, centerY), 10)
+        screen.drawCircle((255, 0, 0), (centerX, centerY + i % 200), 5)
+        screen.update()
+    timer.update()
+    return timer[0] / frames
+
+
+def measureRefresh(timer, screen, frames=120):
+    """Median time per full-screen flip (the refresh interval with vsync)
+
+    None if the screen has no vsync, or flips faster than any display
+    refreshes (so they can't be waiting for the refresh).
+    """
+    if not screen.vsync:
+        return None
+    intervals = []
+    screen.blank()
+    timer.resetAll()
+    for i in range(frames):
+        screen.blank((i % 2, 0, 0))
+        timer.update()
+        intervals.append(timer[1])
+        timer.reset(1)
+    interval = median(intervals)
+    if interval < 1.0 / 500:
+        return None
+    return interval
+
+
+def pickRate(choices, limit):
+    # fastest choice that doesn't exceed limit (slowest if none do)
+    for rate in choices:
+        if rate <= limit:
+            return rate
+    return choices[-1]
+
+
+def recommend(results):
+    """Choose sampleRate and graphicsRate from the measurements
+
+    sampleRate is None if the mouse's report rate couldn't be measured
+    (it didn't move), and graphicsRate is None if the refresh interval
+    couldn't be, since there's nothing to base them on.
+    """
+    # The loop must come round several times per sample to keep jitter
+    # down, and can't sample faster than the mouse reports. Drawing takes
+    # some of the loop's time too.
+    loopRate = 1.0 / max(results['loopCost'], 1e-9)
+    sampleLimit = loopRate / 4.0
+    if results['mouseReportRate'] > 0:
+        sampleRate = pickRate(
+            SAMPLE_RATES, min(sampleLimit, results['mouseReportRate'])
+            )
+    else:
+        sampleRate = None
+    # No point drawing faster than the display refreshes, and drawing
+    # shouldn't take more than half of the loop's time.
+    if results['refreshInterval']:
+        graphicsLimit = min(0.5 / max(results['drawCost'], 1e-9),
+                            1.0 / results['refreshInterval'])
+        graphicsRate = pickRate(GRAPHICS_RATES, graphicsLimit)
+    else:
+        graphicsRate = None
+    return sampleRate, graphicsRate
+
+
+def loadMachineProfile(fileName=DEFAULT_PROFILE):
+    # The saved profile as a dict, or None if there isn't one
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName) as profileFile:
+        return json.load(profileFile)
+
+
+def calibrate(fileName=DEFAULT_PROFILE, width=1024, height=768,
+              fullscreen=True, evdevDevice=None):
+    timer = Clock(2)
+    screen = Monitor(width, height, fullscreen, vsync=True)
+    if evdevDevice:
+        from devices.UseEvdev import MotionHardware as EvdevHardware
+        hardware = EvdevHardware(
+            width / 2, height / 2,
+            None if evdevDevice == 'auto' else evdevDevice
+            )
+    else:
+        hardware = None
+    cursor = Cursor((width / 2, height / 2), hardware=hardware)
+
+    results = {'host': socket.gethostname(), 'platform': platform.platform(),
+               'backend': evdevDevice or 'pygame mouse',
+               'vsync': screen.vsync}
+    results['clockResolution'], results['clockUpdateCost'] = \
+        measureClock(timer)
+    results['loopCost'] = measureLoop(timer, cursor)
+    screen.drawText((255, 255, 255), (width / 2, height / 2),
+                    'Keep moving the mouse...')
+    screen.update()
+    results['mouseReportRate'] = measureMouse(timer, cursor.hardware)
+    results['drawCost'] = measureDraw(timer, screen, width, height)
+    results['refreshInterval'] = measureRefresh(timer, screen)
+    cursor.hardware.close()
+    screen.close()
+
+    results['sampleRate'], results['graphicsRate'] = recommend(results)
+    with open(fileName, 'w') as profileFile:
+        json.dump(results, profileFile, indent=1, sort_keys=True)
+    return results
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    evdevDevice = None
+    if '--evdev' in arguments:
+        i = arguments.index('--evdev')
+        evdevDevice = arguments[i + 1]
+        del arguments[i:i + 2]
+    fileName = arguments[0] if arguments else DEFAULT_PROFILE
+    results = calibrate(fileName, evdevDevice=evdevDevice)
+    for key, value in sorted(results.items()):
+        print('%s: %s' % (key, value))
+    if results['sampleRate'] is None:
+        print('No mouse movement was recorded, so the mouse report rate is '
+              'unknown and no sampleRate is recommended (the experiment '
+              'keeps its own). Run again, moving the mouse throughout.')
+    if results['graphicsRate'] is None:
+        print('The display refresh interval could not be measured (no vsync '
+              'on this display), so no graphicsRate is recommended (the '
+              'experiment keeps its own).')
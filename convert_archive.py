@@ -0,0 +1,285 @@
+# Bulk conversion of existing Data/ output to faster formats.
+#
+#   .mvt -> .mvz  (compressed trajectory archive, see trajectory_archive.py)
+#   .ana -> .npz  (numpy arrays: 'columns' names and a float 'data' table)
+#
+# Files are converted in a process pool, one file per task and streamed
+# trial by trial, with only a few tasks queued at a time so memory stays
+# bounded however large the tree is. Every output is read back and checked
+# (row counts and a checksum of the text it reproduces) before it counts.
+# A manifest in the root directory records what was converted, so
+# unchanged files are skipped on the next run. An .mvt file that was cut
+# off (a session that crashed mid-write) has its complete trials
+# converted; the unfinished one at the end is copied as it is to a
+# .tail file next to the output, and reported.
+#
+# python convert_archive.py [directory] [workers]
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from trajectory_archive import (TrajectoryArchive, TrajectoryArchiveWriter,
+                                formatTrajectory, iterTrajectories)
+
+MANIFEST = 'convert_manifest.json'
+OUTPUT_EXTENSION = {'.mvt': '.mvz', '.ana': '.npz'}
+
+
+def fileHash(fileName):
+    sha = hashlib.sha1()
+    with open(fileName, 'rb') as fileObj:
+        for chunk in iter(lambda: fileObj.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _completeTrials(fileObj, tail):
+    # The text of each trial that ends with its blank line; whatever
+    # comes after the last of them (a trial that was cut off) is left
+    # in tail as a list of lines
+    lines = []
+    for line in fileObj:
+        lines.append(line)
+        if len(lines) > 1 and not line.rstrip('\r\n'):
+            yield ''.join(lines)
+            lines = []
+    tail.extend(lines)
+
+
+def convertMvt(source, target):
+    """Convert one .mvt file to .mvz and verify it
+
+    Returns (trials, rows, tail): tail is the number of lines of an
+    unfinished trial at the end of the file (0 if there isn't one),
+    which are written unchanged to target + '.tail' instead of being
+    converted. Raises ValueError if the archive doesn't reproduce the
+    rest of the source text.
+    """
+    sourceSha = hashlib.sha1()
+    rawSha = hashlib.sha1()
+    tail = []
+    trials = 0
+    rows = 0
+    tmp = target + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    writer = TrajectoryArchiveWriter(tmp)
+    try:
+        with open(source) as fileObj:
+            for text in _completeTrials(fileObj, tail):
+                rawSha.update(text.encode('utf-8'))
+                for header, dataList in iterTrajectories(
+                        text.splitlines(True)):
+                    writer.writeTrial(dataList, header)
+                    sourceSha.update(
+                        formatTrajectory(dataList, header).encode('utf-8')
+                        )
+                    trials += 1
+                    rows += len(dataList)
+    except Exception:
+        writer.close()
+        os.remove(tmp)
+        raise
+    writer.close()
+    tailText = ''.join(tail)
+    if not tailText.strip():
+        # only blank lines after the last trial; not a cut-off trial
+        rawSha.update(tailText.encode('utf-8'))
+        tail = []
+    if trials == 0 and not tail and os.path.getsize(source):
+        os.remove(tmp)
+        raise ValueError('no trials found in %s' % source)
+
+    # The parsed trials must be exactly the file we read:
+    if rawSha.hexdigest() != sourceSha.hexdigest():
+        os.remove(tmp)
+        raise ValueError('%s is not in the format writeTrajectory writes'
+                         % source)
+
+    # ... and the archive must give the same text back:
+    archive = TrajectoryArchive(tmp)
+    archiveSha = hashlib.sha1()
+    archiveRows = 0
+    for i in range(len(archive)):
+        header, dataList = archive.readTrial(i)
+        archiveRows += len(dataList)
+        archiveSha.update(archive.trialText(i).encode('utf-8'))
+    archive.close()
+    if len(archive) != trials or archiveRows != rows or \
+            archiveSha.hexdigest() != sourceSha.hexdigest():
+        os.remove(tmp)
+        raise ValueError('verification of %s failed' % target)
+    os.replace(tmp, target)
+    if tail:
+        with open(target + '.tail', 'w') as tailFile:
+            tailFile.write(tailText)
+    elif os.path.exists(target + '.tail'):
+        # left from converting an earlier, cut-off copy
+        os.remove(target + '.tail')
+    return trials, rows, len(tail)
+
+
+def readAna(fileName):
+    # (column names, float array) from an .ana file. Older files have
+    # rows shorter than the header (aborted trials stop writing early);
+    # the missing values at the end, and any empty ones, are NaN.
+    with open(fileName) as fileObj:
+        columns = fileObj.readline().rstrip('\r\n').rstrip('\t').split('\t')
+        data = []
+        for lineNumber, line in enumerate(fileObj, 2):
+            line = line.rstrip('\r\n').rstrip('\t')
+            if not line:
+                continue
+            values = line.split('\t')
+            if len(values) > len(columns):
+                raise ValueError('%s line %i has more values than columns'
+                                 % (fileName, lineNumber))
+            row = np.full(len(columns), np.nan)
+            row[:len(values)] = [float(v) if v else np.nan for v in values]
+            data.append(row)
+    if not data:
+        return columns, np.empty((0, len(columns)))
+    return columns, np.vstack(data)
+
+
+def convertAna(source, target):
+    """Convert one .ana file to .npz and verify it
+
+    Returns (1, rows).
+    """
+    columns, data = readAna(source)
+    tmp = target + '.tmp.npz'
+    np.savez_compressed(tmp, columns=np.array(columns), data=data)
+    with np.load(tmp) as check:
+        same = list(check['columns']) == columns and \
+            check['data'].shape == data.shape and \
+            hashlib.sha1(check['data'].tobytes()).digest() == \
+            hashlib.sha1(data.tobytes()).digest()
+    if not same:
+        os.remove(tmp)
+        raise ValueError('verification of %s failed' % target)
+    os.replace(tmp, target)
+    return 1, data.shape[0]
+
+
+def convertFile(source):
+    # Worker: convert one file, return a result dict for the manifest
+    start = time.time()
+    base, extension = os.path.splitext(source)
+    target = base + OUTPUT_EXTENSION[extension]
+    result = {
+        'source': source, 'target': target,
+        'bytes': os.path.getsize(source),
+        'mtime': os.path.getmtime(source),
+        'sha1': fileHash(source),
+        }
+    try:
+        if extension == '.mvt':
+            result['trials'], result['rows'], tail = \
+                convertMvt(source, target)
+            if tail:
+                result['truncated'] = tail
+        else:
+            result['trials'], result['rows'] = convertAna(source, target)
+    except Exception as error:
+        result['error'] = str(error)
+    result['seconds'] = time.time() - start
+    return result
+
+
+def findSources(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1] in OUTPUT_EXTENSION:
+                yield os.path.join(root, name)
+
+
+def upToDate(source, entry):
+    """True if the manifest entry shows source was already converted"""
+    if not entry or 'error' in entry or not os.path.exists(entry['target']):
+        return False
+    if entry['mtime'] == os.path.getmtime(source) and \
+            entry['bytes'] == os.path.getsize(source):
+        return True
+    # Touched but maybe not changed; the hash decides.
+    if entry['sha1'] == fileHash(source):
+        entry['mtime'] = os.path.getmtime(source)
+        return True
+    return False
+
+
+def convertTree(directory='Data', workers=None, report=print):
+    """Convert every .ana/.mvt file under directory
+
+    Returns the list of result dicts for the files converted this run.
+    """
+    manifestName = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifestName):
+        with open(manifestName) as fileObj:
+            manifest = json.load(fileObj)
+    else:
+        manifest = {}
+
+    start = time.time()
+    results = []
+    skipped = 0
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+
+        def collect(done):
+            for future in done:
+                result = future.result()
+                manifest[result['source']] = result
+                results.append(result)
+                if 'error' in result:
+                    report('FAILED %s: %s' % (result['source'],
+                                              result['error']))
+                else:
+                    report('%s: %i trials, %i rows, %.2f s' % (
+                        result['source'], result['trials'],
+                        result['rows'], result['seconds']))
+                if 'truncated' in result:
+                    report('TRUNCATED %s: the last trial is unfinished; '
+                           'its %i lines are in %s' % (
+                               result['source'], result['truncated'],
+                               result['target'] + '.tail'))
+
+        for source in findSources(directory):
+            if upToDate(source, manifest.get(source)):
+                skipped += 1
+                continue
+            # Keep only a couple of files per worker in flight:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(convertFile, source))
+        done, pending = wait(pending)
+        collect(done)
+
+    with open(manifestName, 'w') as fileObj:
+        json.dump(manifest, fileObj, indent=1, sort_keys=True)
+
+    elapsed = time.time() - start
+    converted = [r for r in results if 'error' not in r]
+    megabytes = sum(r['bytes'] for r in converted) / 1e6
+    rows = sum(r['rows'] for r in converted)
+    report('Converted %i files (%.1f MB, %i rows), skipped %i, failed %i '
+           'in %.1f s: %.1f files/s, %.1f MB/s, %.0f rows/s' % (
+               len(converted), megabytes, rows, skipped,
+               len(results) - len(converted), elapsed,
+               len(converted) / max(elapsed, 1e-9),
+               megabytes / max(elapsed, 1e-9), rows / max(elapsed, 1e-9)))
+    return results
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'Data'
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    convertTree(directory, workers)
@@ -0,0 +1,63 @@
+# Writes data files on a background thread.
+#
+# Appending to the .ana/.mvt files takes however long the disk takes; done
+# between trials, that time shows up as a variable gap before the next
+# trial. Handing the writes to this thread lets the next trial start
+# straight away. Writes still happen one at a time, in the order given,
+# and once one fails nothing after it is run: later writes (such as the
+# session index recording that trial as saved) may depend on it.
+import queue
+import threading
+
+
+class BackgroundWriter:
+    """Run write calls in order on a background thread
+
+    Example:
+    --------
+    >>> writer = BackgroundWriter()
+    >>> writer.put(experiment.writeAna, ana_data)
+    >>> writer.flush() # wait until everything so far is on disk
+    >>> writer.close()
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    function, args = item
+                    function(*args)
+            except Exception as error:
+                # Reported by the next put() or flush(); the writes
+                # queued after this one are skipped.
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def put(self, function, *args):
+        # Queue a write; raises if an earlier one has failed
+        if self.error:
+            raise self.error
+        self.queue.put((function, args))
+
+    def flush(self):
+        # Block until all queued writes are done; re-raise any failure
+        self.queue.join()
+        if self.error:
+            error = self.error
+            self.error = None
+            raise error
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
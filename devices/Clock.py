@@ -1,13 +1,9 @@
-import os
-# Use the most accurate clock.
-# Tested on Windows XP and Linux.
-if os.name == 'nt':
-    from time import clock as CurrentTime
-    import time
-    ADJUST_FOR_EPOCH = time.time()
-else:
-    from time import time as CurrentTime
-    ADJUST_FOR_EPOCH = 0
+import time
+# Use the most accurate clock. perf_counter is monotonic, so timestamps
+# taken from it never go backwards (time.time can jump when the system
+# clock is adjusted); the offset keeps readings on the time.time scale.
+from time import perf_counter as CurrentTime
+ADJUST_FOR_EPOCH = time.time() - CurrentTime()
 
 class Clock:
     """Class for timers
@@ -2,7 +2,8 @@ import math
 
 # Import the appropriate "MotionHardware" class
 from .UseMouse import MotionHardware
-# Could be expanded for additional plugins.
+# Could be expanded for additional plugins; any other backend (such as
+# UseEvdev.MotionHardware) can be passed in as the hardware argument.
 
 class Cursor:
     """
@@ -15,8 +16,11 @@ class Cursor:
     CurrentRotationRad = 0
     HorizontalMapping = 1
     VerticalMapping = 1
+    # Optional within-trial perturbations (see Perturbation.py); when set,
+    # this takes over from the constant rotation.
+    Perturbation = None
 
-    def __init__(self,CenterPos=(1024/2,768/2),HomePos=None):
+    def __init__(self,CenterPos=(1024/2,768/2),HomePos=None,hardware=None):
         # Create the cursor, start everything at the middle value.
 
         self.CenterX = CenterPos[0]
@@ -41,7 +45,9 @@ class Cursor:
         self.DisplayY = self.CenterY
 
         # Initialize motion hardware (mouse, motion tracker, etc)
-        self.hardware = MotionHardware(self.homeX,self.homeY)
+        if hardware is None:
+            hardware = MotionHardware(self.homeX,self.homeY)
+        self.hardware = hardware
 	
     def invertY(self):
         # Allows y-axis to be inverted (up moves down):
@@ -62,7 +68,9 @@ class Cursor:
         self.HorizontalMapping = math.copysign(newXgain, self.HorizontalMapping)
         self.VerticalMapping = math.copysign(newYgain, self.VerticalMapping)
 
-    def update(self):
+    def update(self, time=0.0):
+        # time (seconds since movement onset) is only used by
+        # perturbation schedules
 
     	# Hardware update
         self.hardware.Update()
@@ -76,6 +84,16 @@ class Cursor:
         dX_Vis = self.CurrentX*self.HorizontalMapping
         dY_Vis = self.CurrentY*self.VerticalMapping
 
+        # Distance is very handy in these experiments, so compute it:
+        self.VisualDisplacement = math.sqrt(dX_Vis**2 + dY_Vis**2)
+
+        if self.Perturbation:
+            (self.DisplayX, self.DisplayY) = \
+                self.Perturbation.displayPosition(
+                    self.CenterX, self.CenterY, dX_Vis, dY_Vis,
+                    self.VisualDisplacement, time)
+            return
+
         # Implement rotation:
         self.DisplayX = int(round(self.CenterX + \
             dX_Vis*math.cos(self.CurrentRotationRad) - \
@@ -83,9 +101,6 @@ class Cursor:
         self.DisplayY = int(round(self.CenterY + \
             dX_Vis*math.sin(self.CurrentRotationRad) + \
             dY_Vis*math.cos(self.CurrentRotationRad)))
-        
-        # Distance is very handy in these experiments, so compute it:
-        self.VisualDisplacement = math.sqrt(dX_Vis**2 + dY_Vis**2)
 
     def setRotationDeg(self,newRotation):
         # set the cursor rotation in degrees
@@ -101,6 +116,10 @@ class Cursor:
         # legacy behavior; assume degrees
         self.setRotationDeg(newRotation)
 
+    def setPerturbation(self,schedule):
+        # use a PerturbationSchedule (or None to go back to plain rotation)
+        self.Perturbation = schedule
+
     def setCenter(self,newCenterX,newCenterY=None):
         # change the position of the graphical center
         if len(newCenterX) == 2:
@@ -18,7 +18,7 @@ def loadImage(filename, colorkey=(0,0,0)):
 class Monitor:
 
     def __init__(self, width=1024, height=768, fullscreen=False, 
-            grabValue=1, textSize=40):
+            grabValue=1, textSize=40, vsync=False):
         
         pygame.init()
         pygame.font.init()
@@ -27,16 +27,36 @@ class Monitor:
         self.horizSize = width
         self.vertSize = height
 
-        if fullscreen:
-            self.myScreen = pygame.display.set_mode((width, height),FULLSCREEN)
-        else:
-            self.myScreen = pygame.display.set_mode((width, height))
+        flags = FULLSCREEN if fullscreen else 0
+        # vsync (flips wait for the display's refresh) needs pygame 2 and
+        # the SCALED flag; self.vsync says whether we actually got it
+        self.vsync = False
+        if vsync:
+            try:
+                self.myScreen = pygame.display.set_mode(
+                    (width, height), flags | SCALED, vsync=1)
+                self.vsync = True
+            except (pygame.error, NameError, TypeError):
+                pass
+        if not self.vsync:
+            self.myScreen = pygame.display.set_mode((width, height), flags)
 
         self.font = pygame.font.Font(None, textSize)
 
         # Using these speeds things up enormously
         self.rectlist = []
         self.blankrectlist = []
+
+        # When set (a surface the size of the screen), blankRects copies
+        # from this instead of filling with a color, so anything drawn on
+        # it stays put while other things move over it:
+        self.background = None
+
+        # Scratch coordinates, reused by the draw* calls so drawing a frame
+        # doesn't build new lists:
+        self.point = [0, 0]
+        self.lineStart = [0, 0]
+        self.lineEnd = [0, 0]
         
         # This slightly speeds up drawText
         self.textDict = {}
@@ -58,8 +78,9 @@ class Monitor:
     def update(self):
         pygame.display.update(self.blankrectlist)
         pygame.display.update(self.rectlist)
-        self.blankrectlist = self.rectlist
-        self.rectlist = []
+        # swap the two lists rather than making a new one each frame
+        self.blankrectlist, self.rectlist = self.rectlist, self.blankrectlist
+        del self.rectlist[:]
 
     def drawObject(self,imageObject,position):
         # draw an object centered on a position
@@ -78,51 +99,85 @@ class Monitor:
         self.rectlist.append(self.myScreen.blit(pygame.transform.flip(imageObject,self.horizFlipped,self.vertFlipped),posAdj))
 
     def blankRects(self,color=(0,0,0)):
-        for rect in self.blankrectlist:
-            self.myScreen.fill(color,rect)
+        if self.background is not None:
+            for rect in self.blankrectlist:
+                self.myScreen.blit(self.background,rect,rect)
+        else:
+            for rect in self.blankrectlist:
+                self.myScreen.fill(color,rect)
+
+    def newSurface(self,color=(0,0,0)):
+        # a blank surface the size of the screen (e.g. for a background)
+        surface = pygame.Surface(self.myScreen.get_size())
+        surface.fill(color)
+        return surface
+
+    def setBackground(self,surface=None):
+        # see self.background; None goes back to filling with a color
+        self.background = surface
+
+    def showBackground(self,rect):
+        # copy part of the background to the screen (update() shows it)
+        self.rectlist.append(self.myScreen.blit(self.background,rect,rect))
 
     def drawFix(self,color,position,radius,width=2):
         # draws a circle with a cross in the center
         self.drawCircle(color,position,radius,width)
-        self.drawLine(color,[position[0]-radius,position[1]],
-                 [position[0]+radius,position[1]],width)
-        self.drawLine(color,[position[0],position[1]-radius],
-                 [position[0],position[1]+radius],width)
+        x, y = position
+        self.drawLineXY(color,x-radius,y,x+radius,y,width)
+        self.drawLineXY(color,x,y-radius,x,y+radius,width)
 
     def drawCircle(self,color,position,radius,width=0):
         # draw a circle.  Filled by default; set width nonzero to leave empty
 
+        x, y = position
         # handle screen flipping
         if self.horizFlipped:
-            position = [self.horizSize-position[0],position[1]]
+            x = self.horizSize-x
         if self.vertFlipped:
-            position = [position[0],self.vertSize-position[1]]
+            y = self.vertSize-y
         
         # Get around deprecation warnings:
-        position = [int(round(position[0])),int(round(position[1]))]
+        point = self.point
+        point[0] = int(round(x))
+        point[1] = int(round(y))
         radius = int(round(radius))
         width = int(round(width))
         
         self.rectlist.append(pygame.draw.circle(self.myScreen,color,\
-                                                    position,radius,width))
+                                                    point,radius,width))
 
     def drawLine(self,color,start_pos,end_pos,width=1):
         # draw a line.
+        self.drawLineXY(color,start_pos[0],start_pos[1],
+                        end_pos[0],end_pos[1],width)
+
+    def drawLineXY(self,color,x1,y1,x2,y2,width=1,surface=None):
+        # draw a line from (x1, y1) to (x2, y2). If a surface is given the
+        # line goes there instead of the screen; either way, returns the
+        # rect drawn in.
                 
         # handle screen flipping
         if self.horizFlipped:
-            start_pos = [self.horizSize-start_pos[0],start_pos[1]]
-            end_pos = [self.horizSize-end_pos[0],end_pos[1]]
+            x1 = self.horizSize-x1
+            x2 = self.horizSize-x2
         if self.vertFlipped:
-            start_pos = [start_pos[0],self.vertSize-start_pos[1]]
-            end_pos = [end_pos[0],self.vertSize-end_pos[1]]
+            y1 = self.vertSize-y1
+            y2 = self.vertSize-y2
         
         # Get around deprecation warnings:
-        start_pos = [int(round(start_pos[0])),int(round(start_pos[1]))]
-        end_pos = [int(round(end_pos[0])),int(round(end_pos[1]))]
-
-        self.rectlist.append(pygame.draw.line(self.myScreen,color,\
-                                                  start_pos,end_pos,width))
+        start_pos = self.lineStart
+        end_pos = self.lineEnd
+        start_pos[0] = int(round(x1))
+        start_pos[1] = int(round(y1))
+        end_pos[0] = int(round(x2))
+        end_pos[1] = int(round(y2))
+
+        if surface is not None:
+            return pygame.draw.line(surface,color,start_pos,end_pos,width)
+        rect = pygame.draw.line(self.myScreen,color,start_pos,end_pos,width)
+        self.rectlist.append(rect)
+        return rect
 
     def drawText(self,color,pos,text,defaultVertIsFlipped = True):
         """Draw (blit) text on the screen (self.screen). If cache is True, the
@@ -0,0 +1,163 @@
+import math
+import random
+
+# Perturbation schedules for the Cursor class.
+#
+# Anything that changes within a trial (a rotation ramping up over time or
+# over reach distance, visual noise) is worked out into lookup tables
+# before the trial starts. Applying a schedule to a sample is then a couple
+# of index computations and table reads, whatever the schedule looks like.
+# The schedule only changes DisplayX/DisplayY; CurrentX/CurrentY stay the
+# hand position. Times are seconds since movement onset (0 until then).
+
+TABLE_SIZE = 1000 # entries in each ramp table
+
+
+class RotationRamp:
+    """Rotation that changes linearly with time or reach distance
+
+    Before `start` the rotation is `fromDeg`; it then ramps to `toDeg` over
+    `length` (seconds after movement onset for 'time', pixels for
+    'distance') and stays there.
+    """
+    def __init__(self, fromDeg, toDeg, length, by='time', start=0.0):
+        self.by = by
+        self.start = start
+        if length > 0:
+            self.scale = (TABLE_SIZE - 1) / float(length)
+        else:
+            # a step: anything past the start is the final rotation
+            self.scale = 1e12
+        self.last = TABLE_SIZE - 1
+        self.cosTable = []
+        self.sinTable = []
+        for i in range(TABLE_SIZE):
+            deg = fromDeg + (toDeg - fromDeg) * i / float(TABLE_SIZE - 1)
+            self.cosTable.append(math.cos(deg * math.pi / 180))
+            self.sinTable.append(math.sin(deg * math.pi / 180))
+
+    def lookup(self, time, distance):
+        x = (time if self.by == 'time' else distance) - self.start
+        if x <= 0:
+            i = 0
+        else:
+            i = min(int(x * self.scale), self.last)
+        return self.cosTable[i], self.sinTable[i]
+
+
+class VisualNoise:
+    """Gaussian noise added to the displayed cursor
+
+    A new offset is drawn every `interval` seconds (and held in between);
+    `duration` seconds' worth are drawn up front, and the sequence starts
+    again from the beginning if the movement goes on longer than that.
+    """
+    def __init__(self, sd, interval=0.05, duration=10.0, rng=random):
+        self.interval = interval
+        count = int(math.ceil(duration / interval)) + 1
+        self.count = count
+        self.offsetX = [rng.gauss(0, sd) for _ in range(count)]
+        self.offsetY = [rng.gauss(0, sd) for _ in range(count)]
+
+    def lookup(self, time):
+        i = int(max(time, 0) / self.interval) % self.count
+        return self.offsetX[i], self.offsetY[i]
+
+
+class PerturbationSchedule:
+    """A trial's worth of precompiled perturbations
+
+    Parameters
+    ----------
+    rotationDeg : numeric (optional)
+        Constant rotation, used unless a ramp or clamp is given.
+
+    ramp : RotationRamp (optional)
+        Rotation that changes within the trial.
+
+    clampDeg : numeric (optional)
+        Error clamp: the cursor moves along this screen angle (in degrees,
+        same convention as the target angle) at the hand's distance from
+        home, whatever direction the hand goes.
+
+    noise : VisualNoise (optional)
+        Noise added on top of everything else.
+    """
+    def __init__(self, rotationDeg=0, ramp=None, clampDeg=None, noise=None):
+        self.cosRot = math.cos(rotationDeg * math.pi / 180)
+        self.sinRot = math.sin(rotationDeg * math.pi / 180)
+        self.ramp = ramp
+        if clampDeg is None:
+            self.clamp = None
+        else:
+            self.clamp = (math.cos(clampDeg * math.pi / 180),
+                          math.sin(clampDeg * math.pi / 180))
+        self.noise = noise
+
+    def displayPosition(self, centerX, centerY, dX, dY, distance, time):
+        """Displayed cursor position for one sample
+
+        dX, dY are the hand displacement after gain/flips, distance is its
+        length, time is seconds since movement onset (0 before it).
+        """
+        if self.clamp:
+            x = centerX + distance * self.clamp[0]
+            y = centerY + distance * self.clamp[1]
+        else:
+            if self.ramp:
+                c, s = self.ramp.lookup(time, distance)
+            else:
+                c, s = self.cosRot, self.sinRot
+            x = centerX + dX * c - dY * s
+            y = centerY + dX * s + dY * c
+        if self.noise:
+            noiseX, noiseY = self.noise.lookup(time)
+            x += noiseX
+            y += noiseY
+        return int(round(x)), int(round(y))
+
+
+def _given(trial_data, key):
+    # True if a target file column is present and not blank (NaN)
+    value = trial_data.get(key)
+    return value is not None and value == value
+
+
+def scheduleFromTrialData(trial_data, rotation, target_angle):
+    """Build a schedule from a target file row, or None if it has none
+
+    Columns understood (all optional):
+        ramp_rotation - rotation (deg) to ramp to from `rotation`
+        ramp_length - seconds (or pixels) the ramp takes; 0 is a step
+        ramp_by - 'time' (default) or 'distance'
+        ramp_start - when (s after movement onset, or px) the ramp
+            begins; default 0
+        clamp_offset - error clamp at target_angle + clamp_offset (deg)
+        noise_sd - visual noise standard deviation (pixels)
+        noise_interval - seconds between new noise values; default 0.05
+    """
+    ramp = None
+    clampDeg = None
+    noise = None
+    if _given(trial_data, 'ramp_rotation'):
+        by = trial_data['ramp_by'] if _given(trial_data, 'ramp_by') \
+            else 'time'
+        ramp = RotationRamp(
+            rotation, trial_data['ramp_rotation'],
+            trial_data['ramp_length'] if _given(trial_data, 'ramp_length')
+            else 0,
+            by,
+            trial_data['ramp_start'] if _given(trial_data, 'ramp_start')
+            else 0.0,
+            )
+    if _given(trial_data, 'clamp_offset'):
+        clampDeg = target_angle + trial_data['clamp_offset']
+    if _given(trial_data, 'noise_sd') and trial_data['noise_sd'] > 0:
+        if _given(trial_data, 'noise_interval'):
+            noise = VisualNoise(trial_data['noise_sd'],
+                                trial_data['noise_interval'])
+        else:
+            noise = VisualNoise(trial_data['noise_sd'])
+    if ramp is None and clampDeg is None and noise is None:
+        return None
+    return PerturbationSchedule(rotation, ramp, clampDeg, noise)
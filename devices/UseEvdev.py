@@ -0,0 +1,255 @@
+# Linux evdev module for Cursor class.
+# Reads relative motion straight from a /dev/input/event* device, without
+# going through pygame/SDL, and keeps the kernel's timestamp for each
+# report (converted to devices.Clock's timebase). Same interface as
+# UseMouse.MotionHardware.
+#
+# A background thread reads the device and adds up the motion; Update()
+# takes a consistent snapshot of it. Anything that produces input_event
+# structs will do as the device: a recorded stream in a file (e.g. from
+# "cat /dev/input/event5 > reach.ev") or a pipe that a test writes to.
+#
+# Reading /dev/input needs permission (usually membership of the "input"
+# group).
+import collections
+import errno
+import fcntl
+import os
+import select
+import struct
+import threading
+
+from .Clock import ADJUST_FOR_EPOCH
+
+# struct input_event: struct timeval time; __u16 type; __u16 code; __s32 value
+EVENT_FORMAT = 'llHHi'
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+
+# from linux/input-event-codes.h:
+EV_SYN = 0x00
+EV_REL = 0x02
+SYN_REPORT = 0
+SYN_DROPPED = 3
+REL_X = 0x00
+REL_Y = 0x01
+
+# from linux/input.h (_IOW('E', 0x90, int) and _IOW('E', 0xa0, int)):
+EVIOCGRAB = 0x40044590
+EVIOCSCLOCKID = 0x400445a0
+# The clock time.perf_counter uses on Linux. Clock adds ADJUST_FOR_EPOCH
+# to perf_counter readings, so adding it to these timestamps puts them on
+# the same scale as Clock.lastTime.
+CLOCK_MONOTONIC = 1
+
+
+def packEvent(time, type, code, value):
+    """One input_event, as the kernel would write it (for test streams)"""
+    seconds = int(time)
+    return struct.pack(EVENT_FORMAT, seconds,
+                       int(round((time - seconds) * 1e6)), type, code, value)
+
+
+def packReport(time, dX, dY):
+    """A complete relative motion report: REL_X, REL_Y and SYN_REPORT"""
+    return packEvent(time, EV_REL, REL_X, dX) + \
+        packEvent(time, EV_REL, REL_Y, dY) + \
+        packEvent(time, EV_SYN, SYN_REPORT, 0)
+
+
+def findMouse(devices='/proc/bus/input/devices'):
+    # The event device of the first mouse the kernel knows about
+    with open(devices) as deviceList:
+        for section in deviceList.read().split('\n\n'):
+            for line in section.splitlines():
+                if line.startswith('H: Handlers='):
+                    handlers = line.split('=', 1)[1].split()
+                    events = [h for h in handlers if h.startswith('event')]
+                    if events and any(h.startswith('mouse') for h in handlers):
+                        return '/dev/input/' + events[0]
+    return None
+
+
+class MotionHardware:
+    """Relative motion read directly from an evdev device
+
+    Parameters
+    ----------
+    homeX, homeY : numeric
+        The home position, as for UseMouse.MotionHardware.
+
+    device : string or int (optional)
+        Path of the event device, or an open file descriptor (such as the
+        read end of a pipe). Default is the first mouse found.
+
+    grab : boolean (optional)
+        Take the device for ourselves, so the desktop cursor doesn't move
+        with it. Default is True.
+
+    maxReports : int (optional)
+        How many timestamped reports to keep for getReports(). Default is
+        10000.
+
+    Example:
+    --------
+    >>> hardware = MotionHardware(512, 384, '/dev/input/event5')
+    >>> hardware.Update()
+    >>> hardware.getRelX(), hardware.getRelY(), hardware.lastTime
+    """
+    def __init__(self, homeX, homeY, device=None, grab=True,
+                 maxReports=10000):
+        self.homeX = homeX
+        self.homeY = homeY
+        self.currentX = homeX
+        self.currentY = homeY
+        # where the motion is counted from:
+        self.originX = homeX
+        self.originY = homeY
+        # time of the last report included by Update(), on the same scale
+        # as Clock.lastTime (for real devices):
+        self.lastTime = None
+
+        if device is None:
+            device = findMouse()
+            if device is None:
+                raise IOError('No mouse found in /proc/bus/input/devices')
+        # added to event times; pipes and recordings are used as they are
+        self.timebase = 0.0
+        if isinstance(device, int):
+            self.fd = device
+            self.ownFd = False
+        else:
+            self.fd = os.open(device, os.O_RDONLY | os.O_NONBLOCK)
+            self.ownFd = True
+            try:
+                fcntl.ioctl(self.fd, EVIOCSCLOCKID,
+                            struct.pack('i', CLOCK_MONOTONIC))
+                self.timebase = ADJUST_FOR_EPOCH
+                if grab:
+                    fcntl.ioctl(self.fd, EVIOCGRAB, 1)
+            except (IOError, OSError):
+                # not an event device (e.g. a recorded stream)
+                pass
+
+        # Written by the reader thread, read by Update(), under the lock:
+        self.lock = threading.Lock()
+        self.totalX = 0
+        self.totalY = 0
+        self.totalTime = None
+        self.reports = collections.deque(maxlen=maxReports)
+        self.dropped = 0 # times the kernel's buffer overflowed
+
+        self.running = True
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        pending = b''
+        dX = dY = 0
+        discarding = False
+        while self.running:
+            ready, _, _ = select.select([self.fd], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.fd, EVENT_SIZE * 64)
+            except OSError as error:
+                if error.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                break # device unplugged
+            if not data:
+                break # end of a recorded stream, or the pipe closed
+            pending += data
+            usable = len(pending) - len(pending) % EVENT_SIZE
+            for seconds, microseconds, type, code, value in \
+                    struct.iter_unpack(EVENT_FORMAT, pending[:usable]):
+                if type == EV_REL:
+                    if code == REL_X:
+                        dX += value
+                    elif code == REL_Y:
+                        dY += value
+                elif type == EV_SYN:
+                    if code == SYN_REPORT and discarding:
+                        # end of a report the kernel couldn't deliver whole
+                        discarding = False
+                        dX = dY = 0
+                    elif code == SYN_REPORT:
+                        time = seconds + microseconds * 1e-6 + \
+                            self.timebase
+                        with self.lock:
+                            self.totalX += dX
+                            self.totalY += dY
+                            self.totalTime = time
+                            self.reports.append(
+                                (time, self.totalX, self.totalY)
+                                )
+                        dX = dY = 0
+                    elif code == SYN_DROPPED:
+                        # events were lost; skip to the next full report
+                        discarding = True
+                        self.dropped += 1
+            pending = pending[usable:]
+        self.running = False
+
+    def Update(self):
+        # take everything reported since the last update
+        with self.lock:
+            self.currentX = self.originX + self.totalX
+            self.currentY = self.originY + self.totalY
+            self.lastTime = self.totalTime
+
+    def getReports(self):
+        """Timestamped reports since the last call, as (time, x, y)
+
+        Times are the kernel's; for real devices they're CLOCK_MONOTONIC
+        plus ADJUST_FOR_EPOCH, the same scale as devices.Clock.lastTime
+        (so a report happened Clock.lastTime - time seconds before the
+        last Clock.update). x and y are in the same coordinates as
+        currentX/currentY.
+        """
+        with self.lock:
+            reports = list(self.reports)
+            self.reports.clear()
+        return [(time, x + self.originX, y + self.originY)
+                for (time, x, y) in reports]
+
+    def getRelX(self):
+        # return distance along X to home position
+        return self.currentX - self.homeX
+
+    def getRelY(self):
+        # return distance along Y to home position
+        return self.currentY - self.homeY
+
+    def setHome(self,newHomeX,newHomeY):
+        # adjust "hardware center"
+        self.homeX = newHomeX
+        self.homeY = newHomeY
+
+    def reHome(self):
+        # adjust "hardware center" to current
+        self.homeX = self.currentX
+        self.homeY = self.currentY
+        # Return the home position for bookkeeping
+        return [self.homeX, self.homeY]
+
+    def close(self):
+        self.running = False
+        self.reader.join()
+        if self.ownFd:
+            os.close(self.fd)
+
+
+if __name__ == "__main__":
+    # Print reports from a device (default: the first mouse) as they come
+    import sys
+    import time
+    hardware = MotionHardware(0, 0, sys.argv[1] if len(sys.argv) > 1
+                              else None, grab=False)
+    try:
+        while hardware.running:
+            time.sleep(0.1)
+            for report in hardware.getReports():
+                print('%.6f\t%i\t%i' % report)
+    except KeyboardInterrupt:
+        pass
+    hardware.close()
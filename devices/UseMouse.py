@@ -18,7 +18,10 @@ class MotionHardware:
         # Since this is just a mouse, update it with the change since
         # the last update. Doing it this way is important, because I
         # expect that the actual mouse cursor will not be visible in
-        # most use-cases:
+        # most use-cases.
+        # The event queue is only read now and then, so pump it here to
+        # get the latest mouse state from the OS:
+        pygame.event.pump()
         [dX,dY] = pygame.mouse.get_rel()
 
         # In a perfect world, I would make sure that currentX and
@@ -46,3 +49,7 @@ class MotionHardware:
         self.homeY = self.currentY
         # Return the home position for bookkeeping
         return [self.homeX, self.homeY]
+
+    def close(self):
+        # Nothing to release for a mouse
+        pass
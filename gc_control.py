@@ -0,0 +1,87 @@
+# Keep the garbage collector out of the trial loop.
+#
+# Reference counting frees almost everything the loop throws away; the
+# cyclic collector only exists for reference cycles, but it runs whenever
+# enough containers have been allocated, which can be in the middle of a
+# reach. So it's switched off for the duration of each trial and run
+# explicitly between trials. What exists once the experiment has started
+# up (modules, the screen, ...) is frozen once, so those collections
+# don't keep rescanning it; nothing is frozen after that, since frozen
+# objects are never collected even if they later become garbage. Every
+# collection (wherever it happens) is timed, so the report shows what the
+# pauses cost.
+import gc
+from time import perf_counter
+
+
+class GCControl:
+    """Garbage collection only between trials, with every pause timed
+
+    Example:
+    --------
+    >>> gcControl = GCControl()
+    >>> gcControl.freezeStartup() # once, when set up
+    >>> gcControl.startTrial()
+    >>> # ... trial loop ...
+    >>> gcControl.endTrial()
+    >>> gcControl.collect() # in the inter-trial interval
+    >>> print(gcControl.report())
+    """
+    def __init__(self):
+        self.reset()
+        self.inTrial = False
+        self.started = None
+        gc.callbacks.append(self._callback)
+
+    def reset(self):
+        # pauses are (generation, seconds, during a trial?)
+        self.pauses = []
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self.started = perf_counter()
+        elif self.started is not None:
+            self.pauses.append(
+                (info['generation'], perf_counter() - self.started,
+                 self.inTrial)
+                )
+            self.started = None
+
+    def freezeStartup(self):
+        # Collect, then leave everything that's left out of later
+        # collections. Only call this once, at startup.
+        gc.collect()
+        gc.freeze()
+
+    def startTrial(self):
+        gc.disable()
+        self.inTrial = True
+
+    def endTrial(self):
+        self.inTrial = False
+
+    def collect(self):
+        """Full collection between trials; returns the pause"""
+        start = perf_counter()
+        gc.collect()
+        gc.enable()
+        return perf_counter() - start
+
+    def close(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+        gc.unfreeze()
+        gc.enable()
+
+    def report(self):
+        """Summary of the collections since the last reset, as text"""
+        lines = ['%-16s %8s %10s %10s' % (
+            'collections', 'count', 'total (ms)', 'max (ms)')]
+        for name, inTrial in (('between trials', False),
+                              ('during trials', True)):
+            times = [t for (generation, t, during) in self.pauses
+                     if during == inTrial]
+            lines.append('%-16s %8i %10.3f %10.3f' % (
+                name, len(times), 1e3 * sum(times),
+                1e3 * max(times) if times else 0.0))
+        return '\n'.join(lines) + '\n'
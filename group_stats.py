@@ -0,0 +1,221 @@
+# Group-level learning curves with bootstrap and permutation statistics.
+#
+# Everything works on a subject x trial matrix of errors (NaN where a
+# subject has no usable trial). A bootstrap resample of subjects is just a
+# vector of how many times each subject was drawn (a multinomial draw), so
+# a whole chunk of resampled group means is one matrix product:
+#   means = (counts @ errors) / (counts @ valid)
+# Chunks bound the memory, and independent seeds let the resamples be
+# spread over a process pool.
+#
+# Example:
+# --------
+# >>> subjects, errors = learningCurveMatrix(glob.glob('Data/*.ana'), block=2)
+# >>> mean, low, high = bootstrapCurve(errors, 10000, workers=4)
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+
+import numpy as np
+
+from live_stats import angularError
+from metrics_cache import anaTrials
+
+
+def learningCurveMatrix(anaFiles, block=None):
+    """Subject x trial matrix of angular errors from .ana files
+
+    Parameters
+    ----------
+    anaFiles : list of strings
+        One .ana file per subject.
+
+    block : numeric (optional)
+        Only use trials from this block. Default is all trials, in order.
+
+    Returns
+    -------
+    (subjects, errors) : (list, 2D array)
+        Subject file names, and their errors in degrees (NaN for missed
+        trials and for subjects with fewer trials).
+    """
+    curves = []
+    for fileName in anaFiles:
+        curve = []
+        for text, trial in anaTrials(fileName):
+            if block is not None and trial.get('blockNumber') != block:
+                continue
+            error = angularError(trial)
+            curve.append(np.nan if error is None else error)
+        curves.append(curve)
+    length = max([len(curve) for curve in curves] + [0])
+    errors = np.full((len(curves), length), np.nan)
+    for i, curve in enumerate(curves):
+        errors[i, :len(curve)] = curve
+    return list(anaFiles), errors
+
+
+def groupMean(errors):
+    # mean over subjects for each trial, ignoring NaNs
+    valid = ~np.isnan(errors)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, errors, 0).sum(0) / valid.sum(0)
+
+
+def _chunks(total, chunkSize):
+    while total > 0:
+        yield min(total, chunkSize)
+        total -= chunkSize
+
+
+def _bootstrapMeans(errors, numResamples, chunkSize, seed):
+    # numResamples x trials array of resampled group means
+    rng = np.random.default_rng(seed)
+    numSubjects = errors.shape[0]
+    valid = (~np.isnan(errors)).astype(float)
+    filled = np.where(valid > 0, errors, 0.0)
+    probabilities = np.full(numSubjects, 1.0 / numSubjects)
+    means = np.empty((numResamples, errors.shape[1]))
+    done = 0
+    for size in _chunks(numResamples, chunkSize):
+        counts = rng.multinomial(numSubjects, probabilities, size=size)
+        counts = counts.astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[done:done + size] = (counts @ filled) / (counts @ valid)
+        done += size
+    return means
+
+
+def _permutationCounts(errors, labels, observed, numPermutations,
+                       chunkSize, seed):
+    # Per trial: how often a relabelled difference is at least as big as
+    # observed, and how many relabellings gave a difference at all (one
+    # group can end up with no data for a trial)
+    rng = np.random.default_rng(seed)
+    valid = (~np.isnan(errors)).astype(float)
+    filled = np.where(valid > 0, errors, 0.0)
+    extreme = np.zeros(errors.shape[1])
+    counted = np.zeros(errors.shape[1])
+    for size in _chunks(numPermutations, chunkSize):
+        groupA = rng.permuted(np.tile(labels, (size, 1)), axis=1)
+        groupA = groupA.astype(float)
+        groupB = 1.0 - groupA
+        with np.errstate(invalid='ignore', divide='ignore'):
+            diff = (groupA @ filled) / (groupA @ valid) - \
+                (groupB @ filled) / (groupB @ valid)
+        tested = ~np.isnan(diff)
+        with np.errstate(invalid='ignore'):
+            extreme += (tested & (np.abs(diff) >= np.abs(observed))).sum(0)
+        counted += tested.sum(0)
+    return extreme, counted
+
+
+def _split(total, parts):
+    # split total into parts nearly equal integers
+    return [total // parts + (1 if i < total % parts else 0)
+            for i in range(parts)]
+
+
+def _chunkSize(rows, columns, maxBytes):
+    # rows of a (rows x columns) float chunk that fit in maxBytes
+    return max(1, int(maxBytes // (8 * max(rows, columns, 1) * 2)))
+
+
+def bootstrapCurve(errors, numResamples=10000, ci=95, seed=None,
+                   workers=None, maxChunkBytes=64 * 2**20):
+    """Bootstrap confidence band for a group learning curve
+
+    Subjects are resampled with replacement; each resample's group mean is
+    worked out for every trial at once.
+
+    Parameters
+    ----------
+    errors : 2D array
+        Subject x trial errors (NaN for missing).
+
+    numResamples : int (optional)
+        Number of bootstrap resamples. Default is 10000.
+
+    ci : numeric (optional)
+        Width of the confidence band in percent. Default is 95.
+
+    seed : int (optional)
+        Seed for reproducible bands.
+
+    workers : int (optional)
+        Spread the resamples over this many processes. Default is to run
+        in this process.
+
+    maxChunkBytes : int (optional)
+        Rough memory limit per chunk of resamples. Default is 64 MB.
+
+    Returns
+    -------
+    (mean, low, high) : arrays
+        Group mean and the lower/upper ends of the band, per trial.
+    """
+    errors = np.asarray(errors, dtype=float)
+    chunkSize = _chunkSize(errors.shape[0], errors.shape[1], maxChunkBytes)
+    seeds = np.random.SeedSequence(seed)
+    if workers and workers > 1:
+        parts = _split(numResamples, workers)
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(_bootstrapMeans, errors, part, chunkSize, child)
+                for part, child in zip(parts, seeds.spawn(workers)) if part
+                ]
+            means = np.concatenate([future.result() for future in futures])
+    else:
+        means = _bootstrapMeans(errors, numResamples, chunkSize, seeds)
+    tail = (100 - ci) / 2.0
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        # trials nobody has data for just come out as NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanpercentile(means, [tail, 100 - tail], axis=0)
+    return groupMean(errors), low, high
+
+
+def permutationTest(errorsA, errorsB, numPermutations=10000, seed=None,
+                    workers=None, maxChunkBytes=64 * 2**20):
+    """Per-trial permutation test for a difference between two groups
+
+    Parameters
+    ----------
+    errorsA, errorsB : 2D arrays
+        Subject x trial errors for each group (same number of trials;
+        NaN for missing).
+
+    Other parameters are as for bootstrapCurve.
+
+    Returns
+    -------
+    (difference, p) : arrays
+        Observed difference of group means (A - B) and its two-sided
+        p-value, per trial. Both are NaN for trials where a group has no
+        data. Relabellings that leave a group without data for a trial
+        don't count toward that trial's p-value.
+    """
+    errorsA = np.asarray(errorsA, dtype=float)
+    errorsB = np.asarray(errorsB, dtype=float)
+    errors = np.vstack((errorsA, errorsB))
+    labels = np.r_[np.ones(errorsA.shape[0]), np.zeros(errorsB.shape[0])]
+    observed = groupMean(errorsA) - groupMean(errorsB)
+    chunkSize = _chunkSize(errors.shape[0], errors.shape[1], maxChunkBytes)
+    seeds = np.random.SeedSequence(seed)
+    if workers and workers > 1:
+        parts = _split(numPermutations, workers)
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(_permutationCounts, errors, labels, observed,
+                            part, chunkSize, child)
+                for part, child in zip(parts, seeds.spawn(workers)) if part
+                ]
+            results = [future.result() for future in futures]
+        extreme = sum(result[0] for result in results)
+        counted = sum(result[1] for result in results)
+    else:
+        extreme, counted = _permutationCounts(
+            errors, labels, observed, numPermutations, chunkSize, seeds
+            )
+    p = (extreme + 1) / (counted + 1.0)
+    p[np.isnan(observed)] = np.nan
+    return observed, p
@@ -0,0 +1,197 @@
+import math
+from collections import deque
+
+
+def angularError(trial):
+    """Signed angular error of a completed trial, in degrees
+
+    The cursor is rotated by `rotation` degrees, so the hand has to go to
+    targetAngle - rotation for the cursor to land on the target. The error
+    is the difference between where the hand ended up (finalAngle, in
+    radians) and that direction, wrapped into [-180, 180).
+
+    On choice trials the target is whichever one was chosen (chosenAngle);
+    targetAngle isn't drawn on those.
+
+    Parameters
+    ----------
+    trial : dict
+        A trial summary as returned by runTrial.
+
+    Returns
+    -------
+    error : float or None
+        The error in degrees, or None if the trial never reached the
+        target distance (or, on a choice trial, reached none of the
+        targets).
+    """
+    if trial.get('movementTime', -1) == -1:
+        return None
+    target = scoredTarget(trial)
+    if target is None:
+        return None
+    final_deg = trial['finalAngle'] * 180.0 / math.pi
+    aim_deg = target - trial['rotation']
+    return (final_deg - aim_deg + 180.0) % 360.0 - 180.0
+
+
+def scoredTarget(trial):
+    """The angle of the target a trial is scored against (None if none)
+
+    targetAngle, unless the trial's target wasn't shown (targetShown is
+    0; files from before it was recorded count as shown). Then it's the
+    target that was chosen instead, or None if none was.
+    """
+    if trial.get('chosenAngle', -1) != -1:
+        return trial['chosenAngle']
+    if trial.get('targetShown', 1) == 0:
+        return None
+    return trial['targetAngle']
+
+
+class RunningStats:
+    """Running count, mean, standard deviation, min and max
+
+    Uses Welford's update, so adding a value is O(1) and nothing is kept
+    around but a handful of floats.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.M2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.M2 / (self.count - 1))
+
+
+class RollingMean:
+    """Mean over the last `window` values, updated in O(1)"""
+    def __init__(self, window=10):
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+
+    def add(self, value):
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+    @property
+    def mean(self):
+        if not self.values:
+            return 0.0
+        return self.total / len(self.values)
+
+
+class LearningCurveStats:
+    """Incremental learning-curve statistics for the experimenter
+
+    Feed this each completed trial summary (the dict runTrial returns) and
+    it keeps per-block and per-target angular error, reaction and movement
+    time summaries, plus rolling windows of the most recent trials. Every
+    update is O(1); the data files are never read back.
+
+    Example:
+    --------
+    >>> stats = LearningCurveStats(window=5)
+    >>> stats.addTrial(ana_data)
+    >>> stats.blockError[0].mean
+    """
+    def __init__(self, window=10):
+        """
+        Parameters
+        ----------
+        window : int (optional)
+            Number of recent trials in the rolling windows. Default is 10.
+        """
+        self.window = window
+        self.numTrials = 0
+        self.numMissed = 0
+        self.lastError = None
+        self.blockError = {}
+        self.targetError = {}
+        self.reactionTime = RunningStats()
+        self.movementTime = RunningStats()
+        self.recentError = RollingMean(window)
+        self.recentAbsError = RollingMean(window)
+        self.recentMovementTime = RollingMean(window)
+
+    def addTrial(self, trial):
+        """Update all statistics with one completed trial
+
+        Parameters
+        ----------
+        trial : dict
+            A trial summary as returned by runTrial. It is not modified.
+        """
+        self.numTrials += 1
+        error = angularError(trial)
+        self.lastError = error
+        if error is None:
+            self.numMissed += 1
+            return
+
+        block = trial['blockNumber']
+        if block not in self.blockError:
+            self.blockError[block] = RunningStats()
+        self.blockError[block].add(error)
+
+        target = scoredTarget(trial)
+        if target not in self.targetError:
+            self.targetError[target] = RunningStats()
+        self.targetError[target].add(error)
+
+        self.recentError.add(error)
+        self.recentAbsError.add(abs(error))
+        if trial['reactionTime'] != -1:
+            self.reactionTime.add(trial['reactionTime'])
+        self.movementTime.add(trial['movementTime'])
+        self.recentMovementTime.add(trial['movementTime'])
+
+    def summaryLines(self):
+        """Short human-readable summary, one string per line"""
+        lines = []
+        if self.lastError is None:
+            last = 'miss'
+        else:
+            last = '%+.1f' % self.lastError
+        lines.append(
+            'Trials: %i (missed %i)  last error: %s deg' %
+            (self.numTrials, self.numMissed, last)
+            )
+        lines.append(
+            'Last %i: error %+.1f deg, |error| %.1f deg, MT %.3f s' %
+            (len(self.recentError.values), self.recentError.mean,
+             self.recentAbsError.mean, self.recentMovementTime.mean)
+            )
+        lines.append(
+            'RT %.3f +/- %.3f s, MT %.3f +/- %.3f s' %
+            (self.reactionTime.mean, self.reactionTime.std,
+             self.movementTime.mean, self.movementTime.std)
+            )
+        for block in sorted(self.blockError):
+            stats = self.blockError[block]
+            lines.append(
+                'Block %i: n=%i error %+.1f +/- %.1f deg' %
+                (block, stats.count, stats.mean, stats.std)
+                )
+        return lines
+
+    def printSummary(self):
+        # Terminal view for the experimenter
+        print('\n'.join(self.summaryLines()))
@@ -0,0 +1,116 @@
+# Low-overhead timing of the phases of the runTrial loop.
+#
+# The loop calls lap(PHASE) right after each phase finishes; the time since
+# the previous lap is charged to that phase. That's one perf_counter call
+# and a few list updates per phase, so the profile barely changes the
+# timing it measures.
+import cProfile
+import io
+import pstats
+from time import perf_counter
+
+# Phases, in loop order:
+CLOCK = 0
+CURSOR = 1
+EVENTS = 2
+SAMPLING = 3
+DRAW = 4
+MONITOR = 5
+STATE = 6
+PHASE_NAMES = [
+    'Clock.update',
+    'Cursor.update',
+    'event polling',
+    'sampling',
+    'drawGraphics',
+    'Monitor.update',
+    'state machine',
+    ]
+
+
+class LoopProfiler:
+    """Per-phase timing counters for the trial loop
+
+    Example:
+    --------
+    >>> profiler = LoopProfiler()
+    >>> profiler.start()
+    >>> # ... Clock.update ...
+    >>> profiler.lap(CLOCK)
+    >>> print(profiler.report())
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        numPhases = len(PHASE_NAMES)
+        self.totals = [0.0] * numPhases
+        self.counts = [0] * numPhases
+        self.maxes = [0.0] * numPhases
+        self.trials = 0
+        self.last = perf_counter()
+        self.cProfiler = None
+
+    def start(self):
+        # Call at the top of each trial so setup time isn't counted
+        self.trials += 1
+        self.last = perf_counter()
+
+    def lap(self, phase):
+        now = perf_counter()
+        dt = now - self.last
+        self.last = now
+        self.totals[phase] += dt
+        self.counts[phase] += 1
+        if dt > self.maxes[phase]:
+            self.maxes[phase] = dt
+
+    def startCProfile(self):
+        # Optionally also run cProfile (much more overhead) over a block
+        self.cProfiler = cProfile.Profile()
+        self.cProfiler.enable()
+
+    def stopCProfile(self):
+        if self.cProfiler:
+            self.cProfiler.disable()
+
+    def report(self):
+        """The per-phase summary as text"""
+        iterations = self.counts[STATE]
+        total = sum(self.totals)
+        lines = [
+            'Trials: %i, loop iterations: %i, time in loop: %.3f s' %
+            (self.trials, iterations, total),
+            ]
+        if total > 0:
+            lines.append('Iterations per second: %.0f' % (iterations / total))
+        lines.append('')
+        lines.append('%-16s %8s %10s %10s %10s %7s' % (
+            'phase', 'calls', 'total (s)', 'mean (us)', 'max (ms)', '% loop'))
+        for phase, name in enumerate(PHASE_NAMES):
+            count = self.counts[phase]
+            lines.append('%-16s %8i %10.4f %10.2f %10.3f %7.1f' % (
+                name, count, self.totals[phase],
+                1e6 * self.totals[phase] / count if count else 0.0,
+                1e3 * self.maxes[phase],
+                100.0 * self.totals[phase] / total if total else 0.0,
+                ))
+        return '\n'.join(lines) + '\n'
+
+    def writeReport(self, fileName):
+        """Write the summary (and cProfile stats, if run) to fileName
+
+        The raw cProfile data also goes next to it, with a .pstats
+        extension, for use with pstats or snakeviz.
+        """
+        with open(fileName, 'w') as reportFile:
+            reportFile.write(self.report())
+            if self.cProfiler:
+                self.cProfiler.dump_stats(
+                    fileName.rsplit('.', 1)[0] + '.pstats'
+                    )
+                stream = io.StringIO()
+                stats = pstats.Stats(self.cProfiler, stream=stream)
+                stats.sort_stats('cumulative').print_stats(30)
+                reportFile.write('\ncProfile (top 30 by cumulative time):\n')
+                reportFile.write(stream.getvalue())
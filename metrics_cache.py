@@ -0,0 +1,249 @@
+# On-disk cache of per-trial derived metrics.
+#
+# Each trial's metrics are stored under a key made from the analysis name,
+# its version and the exact text of the trial, so:
+#   - files that haven't changed (same mtime and size, or same hash) come
+#     straight from the cache without being parsed;
+#   - when trials are appended to a file, only the new trials are computed;
+#   - bumping the version of an analysis recomputes it everywhere.
+# The cache is a single sqlite database, trimmed back to maxBytes by
+# evicting the least recently used entries.
+#
+# Example:
+# --------
+# >>> cache = MetricsCache('Data/metrics_cache.sqlite')
+# >>> errors = cache.anaMetrics('Data/Volunteer.ana', errorMetrics)
+# >>> kinematics = cache.mvtMetrics('Data/Volunteer_01.mvt', reachMetrics)
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+
+from live_stats import angularError
+from trajectory_archive import formatTrajectory, iterTrajectories
+
+
+def anaTrials(fileName):
+    # Yields (row text, trial dict) for every trial of an .ana file
+    with open(fileName) as fileObj:
+        header = fileObj.readline()
+        keys = header.rstrip('\r\n').rstrip('\t').split('\t')
+        for line in fileObj:
+            values = line.rstrip('\r\n').rstrip('\t')
+            if not values:
+                continue
+            trial = {}
+            for key, value in zip(keys, values.split('\t')):
+                try:
+                    trial[key] = float(value)
+                except ValueError:
+                    trial[key] = value
+            yield header + line, trial
+
+
+def mvtTrials(fileName):
+    # Yields (trial text, (header, rows)) for every trial of an .mvt file
+    with open(fileName) as fileObj:
+        for header, rows in iterTrajectories(fileObj):
+            yield formatTrajectory(rows, header), (header, rows)
+
+
+def errorMetrics(trial):
+    """Angular error of one .ana trial (see live_stats.angularError)"""
+    return {
+        'blockNumber': trial.get('blockNumber'),
+        'trialNumber': trial.get('trialNumber'),
+        'angularError': angularError(trial),
+        }
+errorMetrics.version = 2 # 2: choice trials scored against chosenAngle
+
+
+def reachMetrics(trial):
+    """Path length, peak speed and its time for one .mvt trial"""
+    header, rows = trial
+    pathLength = 0.0
+    peakSpeed = 0.0
+    peakTime = None
+    for a, b in zip(rows, rows[1:]):
+        step = math.hypot(b[2] - a[2], b[3] - a[3])
+        pathLength += step
+        if b[0] > a[0] and step / (b[0] - a[0]) > peakSpeed:
+            peakSpeed = step / (b[0] - a[0])
+            peakTime = b[0]
+    return {
+        'trial': header,
+        'samples': len(rows),
+        'pathLength': pathLength,
+        'peakSpeed': peakSpeed,
+        'peakSpeedTime': peakTime,
+        }
+reachMetrics.version = 1
+
+
+class MetricsCache:
+    """Per-trial derived metrics, cached on disk
+
+    Parameters
+    ----------
+    fileName : string
+        The sqlite database to keep the cache in (created if needed).
+
+    maxBytes : int (optional)
+        Size limit for the cached metrics. Default is 256 MB.
+    """
+    def __init__(self, fileName, maxBytes=256 * 2**20):
+        self.maxBytes = maxBytes
+        self.db = sqlite3.connect(fileName)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS metrics ('
+            'key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)'
+            )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT, analysis TEXT, mtime REAL, size INTEGER, '
+            'sha1 TEXT, keys TEXT, PRIMARY KEY (path, analysis))'
+            )
+        self.hits = 0
+        self.misses = 0
+
+    def trialMetrics(self, fileName, trials, compute, version=None):
+        """Metrics for every trial of a file, computing only what's new
+
+        Parameters
+        ----------
+        fileName : string
+            The data file.
+
+        trials : function
+            Called with fileName; yields (trial text, parsed trial), like
+            anaTrials and mvtTrials.
+
+        compute : function
+            Turns one parsed trial into a JSON-friendly value.
+
+        version : (optional)
+            Version of the analysis; defaults to compute.version, or 0.
+            Change it whenever compute changes.
+
+        Returns
+        -------
+        metrics : list
+            compute's result for each trial, in file order.
+        """
+        if version is None:
+            version = getattr(compute, 'version', 0)
+        analysis = '%s.%s:%s' % (
+            compute.__module__, compute.__qualname__, version
+            )
+        path = os.path.abspath(fileName)
+        stat = os.stat(fileName)
+
+        known = self.db.execute(
+            'SELECT mtime, size, sha1, keys FROM files '
+            'WHERE path = ? AND analysis = ?', (path, analysis)
+            ).fetchone()
+        if known and known[0] == stat.st_mtime and known[1] == stat.st_size:
+            values = self._lookup(json.loads(known[3]))
+            if values is not None:
+                return values
+        digest = self._fileHash(fileName)
+        if known and known[2] == digest:
+            values = self._lookup(json.loads(known[3]))
+            if values is not None:
+                self._remember(path, analysis, stat, digest,
+                               json.loads(known[3]))
+                return values
+
+        # Something changed: hash every trial, compute the new ones.
+        keys = []
+        values = []
+        now = time.time()
+        for text, parsed in trials(fileName):
+            key = hashlib.sha1(
+                (analysis + '\0' + text).encode('utf-8')
+                ).hexdigest()
+            keys.append(key)
+            row = self.db.execute(
+                'SELECT value FROM metrics WHERE key = ?', (key,)
+                ).fetchone()
+            if row:
+                self.hits += 1
+                values.append(json.loads(row[0]))
+                self.db.execute(
+                    'UPDATE metrics SET used = ? WHERE key = ?', (now, key)
+                    )
+            else:
+                self.misses += 1
+                value = compute(parsed)
+                encoded = json.dumps(value)
+                self.db.execute(
+                    'INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?)',
+                    (key, encoded, len(encoded), now)
+                    )
+                values.append(value)
+        self._remember(path, analysis, stat, digest, keys)
+        self.evict()
+        return values
+
+    def anaMetrics(self, fileName, compute=errorMetrics, version=None):
+        return self.trialMetrics(fileName, anaTrials, compute, version)
+
+    def mvtMetrics(self, fileName, compute=reachMetrics, version=None):
+        return self.trialMetrics(fileName, mvtTrials, compute, version)
+
+    def _fileHash(self, fileName):
+        sha = hashlib.sha1()
+        with open(fileName, 'rb') as fileObj:
+            for chunk in iter(lambda: fileObj.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def _lookup(self, keys):
+        # Cached values for all keys, or None if any were evicted
+        values = []
+        now = time.time()
+        for key in keys:
+            row = self.db.execute(
+                'SELECT value FROM metrics WHERE key = ?', (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            values.append(json.loads(row[0]))
+        self.db.executemany(
+            'UPDATE metrics SET used = ? WHERE key = ?',
+            [(now, key) for key in keys]
+            )
+        self.db.commit()
+        self.hits += len(keys)
+        return values
+
+    def _remember(self, path, analysis, stat, digest, keys):
+        self.db.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+            (path, analysis, stat.st_mtime, stat.st_size, digest,
+             json.dumps(keys))
+            )
+        self.db.commit()
+
+    def evict(self):
+        """Drop least recently used metrics until under maxBytes"""
+        total = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM metrics'
+            ).fetchone()[0]
+        if total <= self.maxBytes:
+            return
+        doomed = []
+        for key, size in self.db.execute(
+                'SELECT key, size FROM metrics ORDER BY used'):
+            if total <= self.maxBytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self.db.executemany('DELETE FROM metrics WHERE key = ?', doomed)
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,113 @@
+# Incremental drawing of the cursor's path.
+#
+# The path is drawn onto its own surface, which the Monitor uses as its
+# background while the path is shown: blanking the dirty rects copies the
+# path back from there, so it never needs redrawing. Each frame only the
+# segments added since the last frame are drawn, and only their rect is
+# copied to the screen, so a long path costs no more per frame than a
+# short one. Samples closer together than minStep pixels are skipped.
+import math
+
+
+class PathTrail:
+    """The path of the cursor, drawn a few segments at a time
+
+    Parameters
+    ----------
+    screen : Monitor
+        Where the path is shown.
+
+    color : (r, g, b) (optional)
+        Default is white.
+
+    width : int (optional)
+        Line width in pixels. Default is 2.
+
+    minStep : numeric (optional)
+        Points closer than this (in pixels) to the last one kept are
+        skipped. Default is 3; 0 keeps every point.
+
+    Example:
+    --------
+    >>> trail = PathTrail(screen)
+    >>> trail.addPoint(x, y) # for every sample
+    >>> trail.draw() # every frame, before anything drawn on top of it
+    >>> trail.show() # (or show it from the start)
+    >>> trail.clear() # at the end of the trial
+    """
+    def __init__(self, screen, color=(255, 255, 255), width=2, minStep=3):
+        self.screen = screen
+        self.color = color
+        self.width = width
+        self.minStep = minStep
+        self.surface = screen.newSurface()
+        # area of the surface drawn on so far (None if nothing)
+        self.bounds = None
+        self.visible = False
+        # last point drawn, and last point accepted by addPoint:
+        self.lastX = None
+        self.lastY = None
+        self.keptX = None
+        self.keptY = None
+        # points not yet drawn, as a flat list x0, y0, x1, y1, ...
+        self.pending = []
+
+    def addPoint(self, x, y):
+        if self.keptX is not None and \
+                math.hypot(x - self.keptX, y - self.keptY) < self.minStep:
+            return
+        self.keptX = x
+        self.keptY = y
+        self.pending.append(x)
+        self.pending.append(y)
+
+    def draw(self):
+        """Draw the segments added since the last call"""
+        pending = self.pending
+        if not pending:
+            return
+        i = 0
+        if self.lastX is None:
+            # the path's first point; nothing to join it to yet
+            self.lastX, self.lastY = pending[0], pending[1]
+            i = 2
+        drawn = None
+        while i < len(pending):
+            x, y = pending[i], pending[i + 1]
+            rect = self.screen.drawLineXY(
+                self.color, self.lastX, self.lastY, x, y, self.width,
+                self.surface
+                )
+            drawn = rect if drawn is None else drawn.union(rect)
+            self.lastX, self.lastY = x, y
+            i += 2
+        del pending[:]
+        if drawn is None:
+            return
+        self.bounds = drawn if self.bounds is None else self.bounds.union(drawn)
+        if self.visible:
+            self.screen.showBackground(drawn)
+
+    def show(self):
+        """Start showing the path, including everything drawn so far"""
+        self.visible = True
+        self.screen.setBackground(self.surface)
+        if self.bounds is not None:
+            self.screen.showBackground(self.bounds)
+
+    def clear(self):
+        """Erase the path (from the screen too) and start a new one"""
+        if self.bounds is not None:
+            self.surface.fill((0, 0, 0), self.bounds)
+            if self.visible:
+                # copying the now blank area erases it from the screen
+                self.screen.showBackground(self.bounds)
+        if self.visible:
+            self.screen.setBackground(None)
+        self.visible = False
+        self.bounds = None
+        self.lastX = None
+        self.lastY = None
+        self.keptX = None
+        self.keptY = None
+        del self.pending[:]
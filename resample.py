@@ -0,0 +1,163 @@
+# Resample trajectories onto a uniform time grid.
+#
+# Samples are recorded whenever the loop in runTrial crosses the
+# 1/sampleRate threshold, so the real intervals jitter. This puts every
+# trial on an exact grid of 1/rate seconds (starting at the trial's first
+# sample), working on all trials at once: trials are laid end to end on
+# one time axis, so a single np.interp / searchsorted covers all of them.
+import sys
+
+import numpy as np
+
+from trajectory_archive import formatTrajectory, readTrajectoryFile
+
+
+def resampleTrials(trials, rate=100, kind='linear', holdColumns=(1,)):
+    """Resample many trials to a uniform rate in one vectorized pass
+
+    Parameters
+    ----------
+    trials : list
+        One 2D array (or list of rows) per trial. Column 0 is time in
+        seconds and must not decrease within a trial.
+
+    rate : numeric (optional)
+        Output sample rate in Hz. Default is 100.
+
+    kind : string (optional)
+        'linear' (default) or 'cubic' (piecewise cubic Hermite with
+        centered-difference slopes).
+
+    holdColumns : sequence of int (optional)
+        Columns that hold codes rather than positions (the state column,
+        by default). These take the value of the last sample at or before
+        each grid time instead of being interpolated.
+
+    Returns
+    -------
+    resampled : list of arrays
+        One array per trial, with column 0 on the uniform grid.
+    """
+    arrays = [np.asarray(trial, dtype=float) for trial in trials]
+    usable = [i for i, a in enumerate(arrays)
+              if a.ndim == 2 and a.shape[0] > 1]
+    result = list(arrays)
+    if not usable:
+        return result
+    data = np.concatenate([arrays[i] for i in usable])
+    lengths = np.array([arrays[i].shape[0] for i in usable])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    t = data[:, 0]
+    firstTime = t[starts]
+    spans = t[ends - 1] - firstTime
+    # Lay the trials end to end, a second apart, on one time axis:
+    offsets = np.concatenate(([0.0], np.cumsum(spans + 1.0)[:-1]))
+    axis = t + np.repeat(offsets - firstTime, lengths)
+
+    # Uniform grid for every trial:
+    counts = np.floor(spans * rate + 1e-9).astype(int) + 1
+    gridEnds = np.cumsum(counts)
+    step = np.arange(gridEnds[-1]) - np.repeat(gridEnds - counts, counts)
+    local = step / float(rate)
+    query = local + np.repeat(offsets, counts)
+
+    # Index of the sample at or before each grid point, kept inside its
+    # own trial:
+    trialStart = np.repeat(starts, counts)
+    trialEnd = np.repeat(ends, counts)
+    left = np.searchsorted(axis, query, side='right') - 1
+    left = np.clip(left, trialStart, trialEnd - 1)
+
+    out = np.empty((query.shape[0], data.shape[1]))
+    out[:, 0] = local + np.repeat(firstTime, counts)
+    for col in range(1, data.shape[1]):
+        y = data[:, col]
+        if col in holdColumns:
+            out[:, col] = y[left]
+        elif kind == 'cubic':
+            out[:, col] = _hermite(
+                axis, y, query, left, trialStart, trialEnd, starts, ends
+                )
+        else:
+            out[:, col] = np.interp(query, axis, y)
+
+    for i, piece in zip(usable, np.split(out, gridEnds[:-1])):
+        result[i] = piece
+    return result
+
+
+def _hermite(x, y, query, left, trialStart, trialEnd, starts, ends):
+    # Piecewise cubic Hermite interpolation, slopes from centered
+    # differences (one-sided at the ends of each trial)
+    index = np.arange(x.shape[0])
+    previous = index - 1
+    following = index + 1
+    previous[starts] = starts
+    following[ends - 1] = ends - 1
+    dx = x[following] - x[previous]
+    slopes = np.zeros_like(y)
+    np.divide(y[following] - y[previous], dx, out=slopes, where=dx > 0)
+
+    left = np.minimum(left, trialEnd - 2)
+    right = left + 1
+    h = x[right] - x[left]
+    s = np.zeros_like(query)
+    np.divide(query - x[left], h, out=s, where=h > 0)
+    s2 = s * s
+    s3 = s2 * s
+    return ((2 * s3 - 3 * s2 + 1) * y[left] +
+            (s3 - 2 * s2 + s) * h * slopes[left] +
+            (-2 * s3 + 3 * s2) * y[right] +
+            (s3 - s2) * h * slopes[right])
+
+
+def resampleTrajectory(dataList, rate=100, kind='linear', holdColumns=(1,)):
+    """Resample one trial as recorded in runTrial
+
+    Returns a list of rows (plain Python numbers, whole-numbered hold
+    columns as ints), ready for writeTrajectory. With an evdev device the
+    rows have a seventh column, the time of the hardware report behind
+    each sample (-1 before the first); pass holdColumns=(1, 6) for those.
+    """
+    if len(dataList) < 2:
+        return dataList
+    resampled = resampleTrials([dataList], rate, kind, holdColumns)[0]
+    return _toRows(resampled, holdColumns)
+
+
+def _toRows(array, holdColumns):
+    # codes go back to ints; held times (e.g. report times) stay floats
+    intColumns = [col for col in holdColumns
+                  if np.all(array[:, col] == np.round(array[:, col]))]
+    rows = array.tolist()
+    for row in rows:
+        for col in intColumns:
+            row[col] = int(row[col])
+    return rows
+
+
+def resampleFile(inName, outName, rate=100, kind='linear', holdColumns=None):
+    # Offline step: resample every trial of an .mvt file into a new one.
+    # By default the state column is held, and the report time column
+    # too in files recorded with an evdev device (7 columns).
+    trials = readTrajectoryFile(inName)
+    if holdColumns is None:
+        width = max([len(rows[0]) for (header, rows) in trials if rows] or [6])
+        holdColumns = (1, 6) if width == 7 else (1,)
+    resampled = resampleTrials(
+        [rows for (header, rows) in trials], rate, kind, holdColumns
+        )
+    with open(outName, 'w') as outFile:
+        for (header, rows), new in zip(trials, resampled):
+            if len(rows) > 1:
+                rows = _toRows(new, holdColumns)
+            outFile.write(formatTrajectory(rows, header))
+
+
+if __name__ == "__main__":
+    # python resample.py in.mvt out.mvt [rate] [linear|cubic]
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 100
+    kind = sys.argv[4] if len(sys.argv) > 4 else 'linear'
+    resampleFile(sys.argv[1], sys.argv[2], rate, kind)
@@ -0,0 +1,49 @@
+# A small index of where a session has got to, kept next to the data.
+#
+# After every trial the experiment records the block list, the block and
+# trial just saved, and the random number generator state needed to
+# carry on exactly where it left off. Resuming reads only this file; the
+# .ana/.mvt history is never rescanned.
+import json
+import os
+import random
+
+
+def getRngState():
+    # random's state in a JSON-friendly form
+    version, internal, gauss = random.getstate()
+    return [version, list(internal), gauss]
+
+
+def setRngState(state):
+    version, internal, gauss = state
+    random.setstate((version, tuple(internal), gauss))
+
+
+def loadSession(fileName):
+    """The saved session index as a dict, or None if there isn't one
+
+    Keys: blockList, block (1-based number of the block in progress),
+    trial (0-based index of the last trial saved in that block; trials
+    after it haven't been run), numTrials (trials in that block),
+    rngState.
+    """
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName) as sessionFile:
+        return json.load(sessionFile)
+
+
+def saveSession(fileName, blockList, block, trial, numTrials, rngState):
+    session = {
+        'blockList': list(blockList),
+        'block': block,
+        'trial': trial,
+        'numTrials': numTrials,
+        'rngState': rngState,
+        }
+    # Write then rename, so a crash never leaves half an index behind:
+    tmp = fileName + '.tmp'
+    with open(tmp, 'w') as sessionFile:
+        json.dump(session, sessionFile)
+    os.replace(tmp, fileName)
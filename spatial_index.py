@@ -0,0 +1,61 @@
+import math
+
+
+class GridIndex:
+    """Uniform grid of circular objects for constant-time hit testing
+
+    Each object goes into every grid cell its bounding box touches, so a
+    point only has to be checked against the objects in its own cell.
+    With cells about the size of the objects, that's a handful no matter
+    how many objects are on screen.
+
+    Example:
+    --------
+    >>> index = GridIndex(cellSize=20)
+    >>> index.insert(100, 100, 10, 'target')
+    >>> index.hit(105, 95)
+    'target'
+    >>> print(index.hit(300, 300))
+    None
+    """
+    # Cells are keyed by a single int (no tuple per lookup). Screens are
+    # far smaller than this many cells across.
+    ROW = 100003
+
+    def __init__(self, cellSize=20):
+        """
+        Parameters
+        ----------
+        cellSize : numeric (optional)
+            Width of a grid cell in pixels. Around the diameter of the
+            objects works well. Default is 20.
+        """
+        self.cellSize = float(cellSize)
+        self.cells = {}
+
+    def _key(self, x, y):
+        return int(math.floor(x / self.cellSize)) * self.ROW + \
+            int(math.floor(y / self.cellSize))
+
+    def insert(self, x, y, radius, value):
+        """Add a circle of `radius` centered at (x, y)
+
+        `value` is what hit() returns for it (an index, a label, ...).
+        """
+        entry = (x, y, radius * radius, value)
+        first_i = int(math.floor((x - radius) / self.cellSize))
+        last_i = int(math.floor((x + radius) / self.cellSize))
+        first_j = int(math.floor((y - radius) / self.cellSize))
+        last_j = int(math.floor((y + radius) / self.cellSize))
+        for i in range(first_i, last_i + 1):
+            for j in range(first_j, last_j + 1):
+                self.cells.setdefault(i * self.ROW + j, []).append(entry)
+
+    def hit(self, x, y):
+        """Return the value of an object containing (x, y), or None"""
+        cell = self.cells.get(self._key(x, y))
+        if cell:
+            for (ox, oy, r2, value) in cell:
+                if (x - ox) * (x - ox) + (y - oy) * (y - oy) <= r2:
+                    return value
+        return None
@@ -0,0 +1,165 @@
+# Streams trajectory samples and trial summaries to another process
+# (a live plot, a second machine on a local link) over UDP.
+#
+# The publisher never blocks: packets go out through a non-blocking socket
+# from a small bounded queue. If the receiver (or the network stack) can't
+# keep up, the oldest queued packets are dropped and counted instead.
+import socket
+import struct
+import sys
+from collections import deque
+
+DEFAULT_ADDRESS = ('127.0.0.1', 5005)
+
+# Packet types:
+SAMPLE = 1
+TRIAL = 2
+
+# Compact little-endian encodings. Every packet starts with its type and
+# a sequence number, so a receiver can see how many packets it missed.
+#   sample: time, state, CurrentX, CurrentY, DisplayX, DisplayY
+#   trial: block, trial, targetAngle, rotation, finalAngle (rad),
+#          reactionTime, movementTime
+SAMPLE_FORMAT = struct.Struct('<BIdBffii')
+TRIAL_FORMAT = struct.Struct('<BIiiddddd')
+
+
+class TelemetryPublisher:
+    """Non-blocking UDP publisher for samples and trial summaries
+
+    Example:
+    --------
+    >>> telemetry = TelemetryPublisher(('127.0.0.1', 5005))
+    >>> telemetry.publishSample(0.01, 1, 0.0, 0.0, 512, 384)
+    >>> telemetry.close()
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, maxQueued=256):
+        """
+        Parameters
+        ----------
+        address : (host, port) (optional)
+            Where to send packets. Default is 127.0.0.1:5005.
+
+        maxQueued : int (optional)
+            How many packets may wait for the socket before the oldest are
+            dropped. Default is 256.
+        """
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.queue = deque()
+        self.maxQueued = maxQueued
+        self.sequence = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def _enqueue(self, packet):
+        if len(self.queue) >= self.maxQueued:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(packet)
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        self.flush()
+
+    def flush(self):
+        # Send whatever the socket will take right now; leave the rest
+        while self.queue:
+            try:
+                self.sock.sendto(self.queue[0], self.address)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # Nobody listening (ICMP refused) or similar; drop it.
+                self.dropped += 1
+            else:
+                self.sent += 1
+            self.queue.popleft()
+
+    def publishSample(self, time, state, currentX, currentY,
+                      displayX, displayY):
+        self._enqueue(SAMPLE_FORMAT.pack(
+            SAMPLE, self.sequence, time, state,
+            currentX, currentY, displayX, displayY
+            ))
+
+    def publishTrial(self, trial):
+        """Send a trial summary (the dict returned by runTrial)"""
+        self._enqueue(TRIAL_FORMAT.pack(
+            TRIAL, self.sequence,
+            int(trial['blockNumber']), int(trial['trialNumber']),
+            trial['targetAngle'], trial['rotation'], trial['finalAngle'],
+            trial['reactionTime'], trial['movementTime']
+            ))
+
+    def close(self):
+        self.flush()
+        self.sock.close()
+
+
+def decode(packet):
+    """Decode one packet
+
+    Returns
+    -------
+    (kind, values) : (int, tuple)
+        kind is SAMPLE or TRIAL; values are the packed fields following
+        the type byte (sequence number first). Unknown packets give
+        (None, packet).
+    """
+    if packet and packet[0] == SAMPLE and len(packet) == SAMPLE_FORMAT.size:
+        return SAMPLE, SAMPLE_FORMAT.unpack(packet)[1:]
+    if packet and packet[0] == TRIAL and len(packet) == TRIAL_FORMAT.size:
+        return TRIAL, TRIAL_FORMAT.unpack(packet)[1:]
+    return None, packet
+
+
+class TelemetryReceiver:
+    """Local receiver, mostly for testing a publisher
+
+    Example:
+    --------
+    >>> receiver = TelemetryReceiver(('127.0.0.1', 5005))
+    >>> for kind, values in receiver.receive(timeout=1.0):
+    ...     print(kind, values)
+    """
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(address)
+        self.lastSequence = None
+        self.missed = 0
+
+    def receive(self, timeout=None):
+        # Yield decoded packets until nothing arrives for `timeout` seconds
+        self.sock.settimeout(timeout)
+        while True:
+            try:
+                packet = self.sock.recv(64)
+            except socket.timeout:
+                return
+            kind, values = decode(packet)
+            if kind is not None:
+                sequence = values[0]
+                if self.lastSequence is not None:
+                    self.missed += (sequence - self.lastSequence - 1) \
+                        & 0xFFFFFFFF
+                self.lastSequence = sequence
+            yield kind, values
+
+    def close(self):
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    # python telemetry.py [host] [port] -- print everything that arrives
+    host = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ADDRESS[0]
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_ADDRESS[1]
+    receiver = TelemetryReceiver((host, port))
+    try:
+        for kind, values in receiver.receive():
+            if kind == SAMPLE:
+                print('sample', values)
+            elif kind == TRIAL:
+                print('trial', values, 'missed so far:', receiver.missed)
+    except KeyboardInterrupt:
+        pass
+    receiver.close()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from convert_archive import convertAna, convertMvt, readAna
+from trajectory_archive import TrajectoryArchive
+
+TRIAL_TEXT = (
+    'Trial 0:\n'
+    '0.01\t1\t0.0\t0.0\t512\t384\t\n'
+    '0.02\t3\t2.0\t-1.0\t514\t383\t\n'
+    '\n'
+    )
+
+# An old-style .ana file: the second trial was aborted before
+# earlyTime/midpointTime were written, and has an empty value.
+LEGACY_ANA = (
+    'blockNumber\ttrialNumber\trotation\tearlyTime\tmidpointTime\t\n'
+    '1\t1\t0\t0.31\t0.42\t\n'
+    '1\t2\t\t\n'
+    '1\t3\t45\t0.29\t0.40\t\n'
+    )
+
+
+def test_read_ragged_legacy_file(tmp_path):
+    source = tmp_path / 'Volunteer.ana'
+    source.write_text(LEGACY_ANA)
+    columns, data = readAna(str(source))
+    assert columns == ['blockNumber', 'trialNumber', 'rotation',
+                       'earlyTime', 'midpointTime']
+    assert data.shape == (3, 5)
+    assert list(data[0]) == [1, 1, 0, 0.31, 0.42]
+    assert list(data[1][:2]) == [1, 2]
+    assert np.isnan(data[1][2:]).all()
+    assert list(data[2]) == [1, 3, 45, 0.29, 0.40]
+
+
+def test_convert_ragged_legacy_file(tmp_path):
+    source = tmp_path / 'Volunteer.ana'
+    target = tmp_path / 'Volunteer.npz'
+    source.write_text(LEGACY_ANA)
+    assert convertAna(str(source), str(target)) == (1, 3)
+    with np.load(str(target)) as converted:
+        assert converted['data'].shape == (3, 5)
+        assert np.isnan(converted['data'][1][2:]).all()
+
+
+def test_row_longer_than_header(tmp_path):
+    source = tmp_path / 'Bad.ana'
+    source.write_text('a\tb\t\n1\t2\t3\t\n')
+    with pytest.raises(ValueError):
+        readAna(str(source))
+
+
+@pytest.mark.parametrize('cut', [
+    'Trial 1:\n0.01\t1\t0.0\t0.0\t512\t384\t\n', # no blank line
+    'Trial 1:\n0.01\t1\t0.0\t0.0\t512\t38', # cut mid-row
+    'Trial 1:\n', # header only
+    ])
+def test_convert_truncated_mvt(tmp_path, cut):
+    source = tmp_path / 'Volunteer_01.mvt'
+    target = str(tmp_path / 'Volunteer_01.mvz')
+    source.write_text(TRIAL_TEXT + cut)
+    assert convertMvt(str(source), target) == (1, 2, len(cut.splitlines()))
+    archive = TrajectoryArchive(target)
+    assert len(archive) == 1
+    assert archive.trialText(0) == TRIAL_TEXT
+    archive.close()
+    with open(target + '.tail') as tail:
+        assert tail.read() == cut
+
+    # converting the complete file again drops the old tail
+    source.write_text(TRIAL_TEXT + TRIAL_TEXT.replace('Trial 0', 'Trial 1'))
+    assert convertMvt(str(source), target) == (2, 4, 0)
+    assert not (tmp_path / 'Volunteer_01.mvz.tail').exists()
+
+
+def test_convert_mvt_in_another_format(tmp_path):
+    source = tmp_path / 'Volunteer_01.mvt'
+    source.write_text(TRIAL_TEXT.replace('\t\n', '\n'))
+    with pytest.raises(ValueError):
+        convertMvt(str(source), str(tmp_path / 'Volunteer_01.mvz'))
@@ -0,0 +1,30 @@
+import pytest
+
+from data_writer import BackgroundWriter
+
+
+def fail():
+    raise IOError('disk full')
+
+
+def test_nothing_runs_after_a_failed_write():
+    done = []
+    writer = BackgroundWriter()
+    writer.put(done.append, 'ana')
+    writer.put(fail)
+    writer.put(done.append, 'session')
+    with pytest.raises(IOError):
+        writer.flush()
+    assert done == ['ana']
+    # reported once; writing carries on afterwards
+    writer.put(done.append, 'next')
+    writer.close()
+    assert done == ['ana', 'next']
+
+
+def test_put_raises_after_a_failed_write():
+    writer = BackgroundWriter()
+    writer.put(fail)
+    writer.queue.join()
+    with pytest.raises(IOError):
+        writer.put(print, 'never written')
@@ -0,0 +1,69 @@
+import numpy as np
+
+from group_stats import bootstrapCurve, groupMean, permutationTest
+
+nan = np.nan
+
+
+def test_group_mean_ignores_missing():
+    errors = np.array([[1.0, nan, 2.0],
+                       [3.0, nan, nan]])
+    mean = groupMean(errors)
+    assert mean[0] == 2.0
+    assert np.isnan(mean[1])
+    assert mean[2] == 2.0
+
+
+def test_bootstrap_known_answers():
+    errors = np.array([[4.0, 1.0, nan],
+                       [4.0, 2.0, nan],
+                       [4.0, 3.0, nan],
+                       [4.0, 6.0, nan]])
+    mean, low, high = bootstrapCurve(errors, 2000, seed=3)
+    # every resample of a constant column has the same mean:
+    assert (mean[0], low[0], high[0]) == (4.0, 4.0, 4.0)
+    assert mean[1] == 3.0
+    assert 1.0 <= low[1] < 3.0 < high[1] <= 6.0
+    # nobody has data for the last trial:
+    assert np.isnan([mean[2], low[2], high[2]]).all()
+
+
+def test_bootstrap_is_reproducible():
+    errors = np.random.default_rng(0).normal(size=(8, 5))
+    first = bootstrapCurve(errors, 500, seed=7)
+    again = bootstrapCurve(errors, 500, seed=7)
+    for a, b in zip(first, again):
+        assert np.array_equal(a, b)
+
+
+def test_permutation_known_answer():
+    # Of the 20 ways to split six subjects 3/3, only the real split and
+    # its mirror image give a difference as big as the observed one.
+    errorsA = np.ones((3, 1))
+    errorsB = np.zeros((3, 1))
+    difference, p = permutationTest(errorsA, errorsB, 5000, seed=1)
+    assert difference[0] == 1.0
+    assert abs(p[0] - 0.1) < 0.02
+
+
+def test_permutation_untestable_trial_is_nan():
+    rng = np.random.default_rng(2)
+    errorsA = rng.normal(size=(6, 3))
+    errorsB = rng.normal(size=(5, 3))
+    errorsA[:, 1] = nan
+    difference, p = permutationTest(errorsA, errorsB, 2000, seed=1)
+    assert np.isnan(difference[1]) and np.isnan(p[1])
+    assert not np.isnan(p[[0, 2]]).any()
+
+
+def test_permutation_only_counts_testable_relabellings():
+    # One subject in each group has data. Relabellings that put neither
+    # of them in a group can't be tested; every other relabelling gives a
+    # difference of +/-5, as big as observed, so p must be 1.
+    errorsA = np.array([[5.0], [nan], [nan]])
+    errorsB = np.array([[0.0], [nan], [nan]])
+    for workers in (None, 2):
+        difference, p = permutationTest(errorsA, errorsB, 2000, seed=4,
+                                        workers=workers)
+        assert difference[0] == 5.0
+        assert p[0] == 1.0
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+from live_stats import LearningCurveStats, angularError
+
+
+def reach(finalDegrees, **values):
+    trial = {'blockNumber': 1, 'rotation': 0, 'targetAngle': 0,
+             'reactionTime': 0.3, 'movementTime': 0.2, 'chosenAngle': -1,
+             'targetShown': 1, 'finalAngle': math.radians(finalDegrees)}
+    trial.update(values)
+    return trial
+
+
+def test_center_out_error():
+    assert angularError(reach(10, targetAngle=0)) == pytest.approx(10)
+    assert angularError(reach(350, targetAngle=0)) == pytest.approx(-10)
+    # the hand has to aim rotation degrees away from the target:
+    assert angularError(reach(-30, targetAngle=0, rotation=45)) == \
+        pytest.approx(15)
+    assert angularError(reach(0, movementTime=-1)) is None
+
+
+def test_choice_trials_are_scored_against_the_chosen_target():
+    # targetAngle (undrawn) is 0, the reach went to the target at 90
+    trial = reach(95, targetShown=0, chosenAngle=90.0)
+    assert angularError(trial) == pytest.approx(5)
+    # passed the ring without choosing: nothing to score against
+    assert angularError(reach(95, targetShown=0)) is None
+
+
+def test_files_from_before_target_shown():
+    trial = reach(95, chosenAngle=90.0)
+    del trial['targetShown']
+    assert angularError(trial) == pytest.approx(5)
+    del trial['chosenAngle']
+    assert angularError(trial) == pytest.approx(95)
+
+
+def test_learning_curve_per_target():
+    stats = LearningCurveStats()
+    stats.addTrial(reach(5))
+    stats.addTrial(reach(85, targetShown=0, chosenAngle=90.0))
+    stats.addTrial(reach(85, targetShown=0))
+    assert stats.numMissed == 1
+    assert stats.targetError[0].mean == pytest.approx(5)
+    assert stats.targetError[90.0].mean == pytest.approx(-5)
@@ -0,0 +1,28 @@
+import pytest
+
+from resample import resampleTrajectory
+
+# time, state, x, y, xCursor, yCursor, report time (-1 before the first)
+EVDEV_TRIAL = [
+    [0.000, 1, 0, 0, 0, 0, -1],
+    [0.004, 1, 0, 0, 0, 0, -1],
+    [0.010, 2, 4, 2, 4, 2, 0.0091],
+    [0.021, 2, 8, 4, 8, 4, 0.0203],
+    ]
+
+
+def test_report_time_is_held_not_interpolated():
+    rows = resampleTrajectory(EVDEV_TRIAL, 200, holdColumns=(1, 6))
+    assert [row[0] for row in rows] == [0.0, 0.005, 0.01, 0.015, 0.02]
+    assert [row[6] for row in rows] == [-1, -1, 0.0091, 0.0091, 0.0091]
+    assert [row[1] for row in rows] == [1, 1, 2, 2, 2]
+    assert all(isinstance(row[1], int) for row in rows)
+    # positions are still interpolated:
+    assert rows[3][2] == pytest.approx(4 + 4 * 5 / 11.0)
+
+
+def test_state_only():
+    rows = resampleTrajectory([row[:6] for row in EVDEV_TRIAL], 100)
+    assert [row[:3] for row in rows] == [
+        [0.0, 1, 0.0], [0.01, 2, 4.0], [0.02, 2, pytest.approx(8 - 4 / 11.0)]
+        ]
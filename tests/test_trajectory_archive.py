@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+from trajectory_archive import (TrajectoryArchive, TrajectoryArchiveWriter,
+                                formatTrajectory)
+
+
+def sameValue(a, b):
+    # equal, including NaN and the sign of zero
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, float):
+        return repr(a) == repr(b) and \
+            math.copysign(1, a) == math.copysign(1, b)
+    return a == b
+
+
+TRIALS = [
+    # typical samples: float times, int states and positions
+    [[0.01, 1, 0.0, 0.0, 512, 384],
+     [0.0200042724609375, 3, 2.0, -1.0, 514, 383]],
+    # whole-number floats including -0.0, in a column that's otherwise
+    # stored as varints
+    [[0.0, 1, -0.0, 5.0, 1, 2],
+     [0.1, 1, 3.0, -0.0, 1, 2]],
+    # NaN, infinities and non-integer floats
+    [[float('nan'), 1, 1.5, float('inf'), 0, 0],
+     [0.2, 1, -2.25, float('-inf'), 0, 0]],
+    # large ints, beyond 64 bits
+    [[0.0, 2**70, -2**63, 2**53 + 1.0, 0, 0],
+     [0.1, -2**70, 2**64, -(2**53) - 2.0, 0, 0]],
+    # not a table: stored as text
+    [[1, 2], [3]],
+    [],
+    ]
+
+
+@pytest.mark.parametrize('compression', ['zlib', 'lzma'])
+def test_round_trip(tmp_path, compression):
+    fileName = str(tmp_path / 'Volunteer_01.mvz')
+    writer = TrajectoryArchiveWriter(fileName, compression)
+    for i, rows in enumerate(TRIALS):
+        writer.writeTrial(rows, 'Trial %i:' % i)
+    writer.close()
+
+    archive = TrajectoryArchive(fileName)
+    assert len(archive) == len(TRIALS)
+    for i, rows in enumerate(TRIALS):
+        assert archive.trialText(i) == formatTrajectory(rows, 'Trial %i:' % i)
+        header, readRows = archive.readTrial(i)
+        if rows and len(set(len(row) for row in rows)) == 1:
+            assert len(readRows) == len(rows)
+            for row, readRow in zip(rows, readRows):
+                assert all(sameValue(a, b) for a, b in zip(row, readRow))
+    archive.close()
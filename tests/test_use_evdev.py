@@ -0,0 +1,108 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('fcntl')
+
+from devices.UseEvdev import (MotionHardware, packEvent, packReport,
+                              EV_REL, EV_SYN, REL_X, REL_Y, SYN_DROPPED,
+                              SYN_REPORT)
+
+
+def waitFor(hardware, condition, timeout=2.0):
+    # the reader thread runs on its own; give it time to catch up
+    end = time.time() + timeout
+    while time.time() < end:
+        hardware.Update()
+        if condition():
+            return
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pipe():
+    read, write = os.pipe()
+    yield read, write
+    for fd in (read, write):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def test_reports_are_added_up(pipe):
+    read, write = pipe
+    hardware = MotionHardware(100, 50, read)
+    os.write(write, packReport(1.0, 3, -2) + packReport(1.001, 4, 1))
+    waitFor(hardware, lambda: hardware.lastTime == 1.001)
+    assert (hardware.getRelX(), hardware.getRelY()) == (7, -1)
+    assert hardware.getReports() == [(1.0, 103, 48), (1.001, 107, 49)]
+    assert hardware.getReports() == []
+    os.close(write)
+    hardware.close()
+
+
+def test_report_split_across_reads(pipe):
+    read, write = pipe
+    hardware = MotionHardware(0, 0, read)
+    data = packReport(2.5, 5, 6)
+    os.write(write, data[:30])
+    time.sleep(0.1)
+    hardware.Update()
+    # nothing counts until the report is complete:
+    assert (hardware.getRelX(), hardware.getRelY()) == (0, 0)
+    assert hardware.lastTime is None
+    os.write(write, data[30:])
+    waitFor(hardware, lambda: hardware.lastTime is not None)
+    assert (hardware.getRelX(), hardware.getRelY(), hardware.lastTime) == \
+        (5, 6, 2.5)
+    os.close(write)
+    hardware.close()
+
+
+def test_dropped_events_skip_to_next_report(pipe):
+    read, write = pipe
+    hardware = MotionHardware(0, 0, read)
+    os.write(write,
+             packReport(1.0, 1, 1) +
+             packEvent(1.1, EV_REL, REL_X, 50) +
+             packEvent(1.1, EV_SYN, SYN_DROPPED, 0) +
+             packEvent(1.2, EV_REL, REL_Y, 50) +
+             packEvent(1.3, EV_SYN, SYN_REPORT, 0) + # ends the bad report
+             packReport(1.4, 2, 3))
+    waitFor(hardware, lambda: hardware.lastTime == 1.4)
+    assert (hardware.getRelX(), hardware.getRelY()) == (3, 4)
+    assert hardware.dropped == 1
+    os.close(write)
+    hardware.close()
+
+
+def test_rehome(pipe):
+    read, write = pipe
+    hardware = MotionHardware(10, 10, read)
+    os.write(write, packReport(1.0, 4, 4))
+    waitFor(hardware, lambda: hardware.lastTime == 1.0)
+    assert hardware.reHome() == [14, 14]
+    assert (hardware.getRelX(), hardware.getRelY()) == (0, 0)
+    os.write(write, packReport(1.1, -1, 2))
+    waitFor(hardware, lambda: hardware.lastTime == 1.1)
+    assert (hardware.getRelX(), hardware.getRelY()) == (-1, 2)
+    os.close(write)
+    hardware.close()
+
+
+def test_recorded_stream(tmp_path):
+    recording = tmp_path / 'reach.ev'
+    recording.write_bytes(b''.join(
+        packReport(2 + i / 1000.0, 1, -1) for i in range(500)
+        ))
+    hardware = MotionHardware(0, 0, str(recording))
+    hardware.reader.join(2.0)
+    hardware.Update()
+    assert (hardware.currentX, hardware.currentY) == (500, -500)
+    assert hardware.lastTime == pytest.approx(2.499)
+    # files aren't event devices, so times are used as they are:
+    assert hardware.timebase == 0.0
+    assert len(hardware.getReports()) == 500
+    hardware.close()
@@ -0,0 +1,389 @@
+# Compressed trajectory archives (.mvz) with per-trial random access.
+#
+# An archive holds the same trials writeTrajectory puts in an .mvt file,
+# and formatTrajectory() turns any trial back into exactly the text the
+# .mvt file would have had. Each trial is stored as its own compressed
+# record, so reading one trial never touches the others:
+#
+#   record: RECORD_MAGIC, method, header length, payload length,
+#           header (utf-8), compressed payload
+#   ...
+#   index: one (offset, rows) entry per record (rows is -1 if unknown)
+#   footer: index offset, number of trials, FOOTER_MAGIC
+#
+# Inside a payload the trial is stored column by column. Integer columns
+# (state, DisplayX/Y, and CurrentX/Y when they hold whole numbers) become
+# zigzag varint deltas, which are mostly single bytes. Other floats
+# (timestamps) are XORed with the previous value's bits and byte-shuffled,
+# which keeps them exact while still compressing well. Trials that aren't
+# a rectangular table of numbers are stored as their text.
+import lzma
+import math
+import os
+import struct
+import sys
+import zlib
+
+RECORD_MAGIC = b'TR'
+FOOTER_MAGIC = b'MVZ1'
+RECORD = struct.Struct('<2sBHI')
+FOOTER = struct.Struct('<QI4s')
+INDEX_ENTRY = struct.Struct('<Qi')
+FLOAT_BITS = struct.Struct('<d')
+
+# compression methods
+ZLIB = 0
+LZMA = 1
+METHODS = {'zlib': ZLIB, 'lzma': LZMA}
+
+# payload kinds
+TABLE = 0
+TEXT = 1
+
+# column types
+INT = 0
+WHOLE_FLOAT = 1
+FLOAT = 2
+
+
+def formatTrajectory(dataList, header='Trial:\n'):
+    """Text of one trial, exactly as it appears in an .mvt file"""
+    if not('\n' in header):
+        header = header + '\n'
+    lines = [header]
+    for datum in dataList:
+        try:
+            lines.append(''.join(str(column) + '\t' for column in datum))
+        except:
+            lines.append(str(datum))
+        lines.append('\n')
+    lines.append('\n')
+    return ''.join(lines)
+
+
+def _parseValue(text):
+    # inverse of str() for the ints and floats in a trajectory
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def iterTrajectories(lines):
+    """Parse .mvt text, one trial at a time
+
+    Parameters
+    ----------
+    lines : iterable of strings
+        Lines of an .mvt file (an open file works, and is read lazily).
+
+    Yields
+    ------
+    (header, rows) : (string, list)
+        The trial header without its newline, and the sample rows with
+        ints and floats as they were before writing, so formatTrajectory
+        gives back the original text.
+    """
+    header = None
+    rows = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if header is None:
+            if line:
+                header = line
+                rows = []
+        elif line:
+            values = line.rstrip('\t').split('\t')
+            rows.append([_parseValue(v) for v in values])
+        else:
+            yield header, rows
+            header = None
+    if header is not None:
+        yield header, rows
+
+
+def readTrajectoryFile(fileName):
+    # All trials of an .mvt file as a list of (header, rows)
+    with open(fileName) as fileObj:
+        return list(iterTrajectories(fileObj))
+
+
+def _compress(data, method):
+    if method == LZMA:
+        return lzma.compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(data, method):
+    if method == LZMA:
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def _putVarint(out, value):
+    # zigzag, then 7 bits per byte
+    value = value << 1 if value >= 0 else ((-value) << 1) - 1
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _getVarint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), pos
+
+
+def _columnType(values):
+    # None if the column can't be stored exactly as numbers
+    if all(type(v) is int for v in values):
+        return INT
+    if all(type(v) is float for v in values):
+        # (-0.0 is whole, but would come back as 0.0)
+        if all(v.is_integer() and abs(v) < 2**53 and
+               not(v == 0 and math.copysign(1, v) < 0) for v in values):
+            return WHOLE_FLOAT
+        return FLOAT
+    return None
+
+
+def _encodeTable(rows):
+    # Returns the payload, or None if the rows can't be stored as a table
+    try:
+        ncols = len(rows[0]) if rows else 0
+        if any(len(row) != ncols for row in rows):
+            return None
+    except TypeError:
+        return None
+    out = bytearray(struct.pack('<BII', TABLE, len(rows), ncols))
+    for col in range(ncols):
+        values = [row[col] for row in rows]
+        kind = _columnType(values)
+        if kind is None:
+            return None
+        out.append(kind)
+        if kind == FLOAT:
+            previous = 0
+            words = []
+            for v in values:
+                bits = struct.unpack('<Q', FLOAT_BITS.pack(v))[0]
+                words.append(bits ^ previous)
+                previous = bits
+            packed = struct.pack('<%iQ' % len(words), *words)
+            # byte-shuffle: all first bytes, then all second bytes, ...
+            for b in range(8):
+                out += packed[b::8]
+        else:
+            previous = 0
+            for v in values:
+                v = int(v)
+                _putVarint(out, v - previous)
+                previous = v
+    return bytes(out)
+
+
+def _decodePayload(payload):
+    if payload[0] == TEXT:
+        return payload[1:].decode('utf-8')
+    kind, nrows, ncols = struct.unpack_from('<BII', payload, 0)
+    pos = struct.calcsize('<BII')
+    columns = []
+    for col in range(ncols):
+        kind = payload[pos]
+        pos += 1
+        if kind == FLOAT:
+            shuffled = payload[pos:pos + 8 * nrows]
+            pos += 8 * nrows
+            packed = bytearray(8 * nrows)
+            for b in range(8):
+                packed[b::8] = shuffled[b * nrows:(b + 1) * nrows]
+            previous = 0
+            values = []
+            for word in struct.unpack('<%iQ' % nrows, bytes(packed)):
+                previous ^= word
+                values.append(
+                    FLOAT_BITS.unpack(struct.pack('<Q', previous))[0]
+                    )
+        else:
+            previous = 0
+            values = []
+            for _ in range(nrows):
+                delta, pos = _getVarint(payload, pos)
+                previous += delta
+                values.append(previous)
+            if kind == WHOLE_FLOAT:
+                values = [float(v) for v in values]
+        columns.append(values)
+    return [list(row) for row in zip(*columns)] if ncols else \
+        [[] for _ in range(nrows)]
+
+
+def _readFooter(fileObj):
+    # Returns (index offset, trials), or None if there's no valid footer
+    fileObj.seek(0, os.SEEK_END)
+    size = fileObj.tell()
+    if size < FOOTER.size:
+        return None
+    fileObj.seek(size - FOOTER.size)
+    offset, count, magic = FOOTER.unpack(fileObj.read(FOOTER.size))
+    if magic != FOOTER_MAGIC or \
+            offset + count * INDEX_ENTRY.size + FOOTER.size != size:
+        return None
+    return offset, count
+
+
+def _scanRecords(fileObj):
+    # Rebuild the index by walking the records (e.g. after a crash)
+    index = []
+    fileObj.seek(0)
+    while True:
+        offset = fileObj.tell()
+        raw = fileObj.read(RECORD.size)
+        if len(raw) < RECORD.size:
+            break
+        magic, method, headerLen, payloadLen = RECORD.unpack(raw)
+        if magic != RECORD_MAGIC:
+            break
+        body = fileObj.read(headerLen + payloadLen)
+        if len(body) < headerLen + payloadLen:
+            break
+        index.append((offset, -1))
+    return index, offset
+
+
+def _readIndex(fileObj):
+    footer = _readFooter(fileObj)
+    if footer is None:
+        return _scanRecords(fileObj)
+    offset, count = footer
+    fileObj.seek(offset)
+    raw = fileObj.read(count * INDEX_ENTRY.size)
+    index = [INDEX_ENTRY.unpack_from(raw, i * INDEX_ENTRY.size)
+             for i in range(count)]
+    return index, offset
+
+
+class TrajectoryArchiveWriter:
+    """Writes trials to an .mvz archive, appending if it already exists
+
+    The index is written by close(), so keep one writer open to add many
+    trials quickly. If the program dies first, readers rebuild the index
+    from the records.
+
+    Example:
+    --------
+    >>> writer = TrajectoryArchiveWriter('Data/Volunteer_01.mvz')
+    >>> writer.writeTrial(traj, 'Trial 0:')
+    >>> writer.close()
+    """
+    def __init__(self, fileName, compression='zlib'):
+        self.method = METHODS[compression]
+        mode = 'r+b' if os.path.exists(fileName) else 'w+b'
+        self.fileObj = open(fileName, mode)
+        self.index, end = _readIndex(self.fileObj)
+        self.fileObj.seek(end)
+        self.fileObj.truncate()
+
+    def writeTrial(self, dataList, header='Trial:\n'):
+        payload = _encodeTable(dataList)
+        if payload is None:
+            body = formatTrajectory(dataList, header)
+            payload = bytes([TEXT]) + body.encode('utf-8')
+        compressed = _compress(payload, self.method)
+        headerBytes = header.encode('utf-8')
+        self.index.append((self.fileObj.tell(), len(dataList)))
+        self.fileObj.write(RECORD.pack(
+            RECORD_MAGIC, self.method, len(headerBytes), len(compressed)
+            ))
+        self.fileObj.write(headerBytes)
+        self.fileObj.write(compressed)
+
+    def close(self):
+        indexOffset = self.fileObj.tell()
+        for entry in self.index:
+            self.fileObj.write(INDEX_ENTRY.pack(*entry))
+        self.fileObj.write(
+            FOOTER.pack(indexOffset, len(self.index), FOOTER_MAGIC)
+            )
+        self.fileObj.close()
+
+
+def appendTrial(fileName, dataList, header='Trial:\n', compression='zlib'):
+    """Append one trial to an archive, creating it if needed
+
+    Like writeTrajectory, this opens and closes the file every trial so
+    nothing is lost if the program dies; the index is rewritten each time.
+    """
+    writer = TrajectoryArchiveWriter(fileName, compression)
+    writer.writeTrial(dataList, header)
+    writer.close()
+
+
+class TrajectoryArchive:
+    """Read access to an .mvz archive
+
+    Example:
+    --------
+    >>> archive = TrajectoryArchive('Data/Volunteer_01.mvz')
+    >>> len(archive)
+    24
+    >>> header, rows = archive.readTrial(3)
+    >>> archive.toText() == open('Data/Volunteer_01.mvt').read()
+    True
+    """
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.fileObj = open(fileName, 'rb')
+        self.index, _ = _readIndex(self.fileObj)
+
+    def __len__(self):
+        return len(self.index)
+
+    def readTrial(self, which):
+        """Decompress a single trial
+
+        Returns
+        -------
+        (header, rows) : (string, list)
+            The header passed to writeTrajectory and the sample rows.
+            Trials that were stored as text come back as a string instead
+            of rows.
+        """
+        self.fileObj.seek(self.index[which][0])
+        magic, method, headerLen, payloadLen = \
+            RECORD.unpack(self.fileObj.read(RECORD.size))
+        header = self.fileObj.read(headerLen).decode('utf-8')
+        payload = _decompress(self.fileObj.read(payloadLen), method)
+        return header, _decodePayload(payload)
+
+    def trialText(self, which):
+        # the .mvt text of one trial
+        header, rows = self.readTrial(which)
+        if isinstance(rows, str):
+            return rows
+        return formatTrajectory(rows, header)
+
+    def toText(self):
+        # the whole .mvt file
+        return ''.join(self.trialText(i) for i in range(len(self)))
+
+    def close(self):
+        self.fileObj.close()
+
+
+if __name__ == "__main__":
+    # python trajectory_archive.py file.mvz [trial] -- print as .mvt text
+    archive = TrajectoryArchive(sys.argv[1])
+    if len(sys.argv) > 2:
+        sys.stdout.write(archive.trialText(int(sys.argv[2])))
+    else:
+        sys.stdout.write(archive.toText())
+    archive.close()
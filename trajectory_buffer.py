@@ -0,0 +1,144 @@
+# Shares the current trajectory with other processes through a
+# multiprocessing.shared_memory ring buffer.
+#
+# The experiment writes each sample straight into the shared block with
+# struct.pack_into (no serialization, no locks), then bumps a sequence
+# counter. Readers copy what they need and re-check the counter to make
+# sure the writer didn't lap them while they were reading.
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+# Header: sequence (samples written so far), current trial number,
+# sequence at which the current trial started, ring capacity.
+HEADER = struct.Struct('<qqqq')
+# One sample as recorded in runTrial:
+# time, state, CurrentX, CurrentY, DisplayX, DisplayY
+SAMPLE = struct.Struct('<dqdddd')
+
+SEQUENCE_OFFSET = 0
+TRIAL_OFFSET = 8
+TRIAL_START_OFFSET = 16
+COUNTER = struct.Struct('<q')
+
+
+class SharedTrajectoryBuffer:
+    """Experiment-side writer for the shared trajectory ring buffer
+
+    Example:
+    --------
+    >>> buf = SharedTrajectoryBuffer('centerout_traj', capacity=4096)
+    >>> buf.startTrial(1)
+    >>> buf.write(0.01, 1, 0.0, 0.0, 512, 384)
+    >>> buf.close()
+    """
+    def __init__(self, name=None, capacity=4096):
+        """
+        Parameters
+        ----------
+        name : string (optional)
+            Name of the shared memory block, so readers can find it.
+            If None, the system picks one (see self.name).
+
+        capacity : int (optional)
+            Number of samples kept before the oldest are overwritten.
+            Default is 4096 (about 40 s at 100 Hz).
+        """
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True,
+            size=HEADER.size + capacity * SAMPLE.size
+            )
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.sequence = 0
+        HEADER.pack_into(self.buf, 0, 0, -1, 0, capacity)
+
+    def startTrial(self, trial_number):
+        # Readers use this to pick out the current trial's samples
+        COUNTER.pack_into(self.buf, TRIAL_START_OFFSET, self.sequence)
+        COUNTER.pack_into(self.buf, TRIAL_OFFSET, trial_number)
+
+    def write(self, time, state, currentX, currentY, displayX, displayY):
+        offset = HEADER.size + (self.sequence % self.capacity) * SAMPLE.size
+        SAMPLE.pack_into(self.buf, offset, time, state,
+                         currentX, currentY, displayX, displayY)
+        # Publish only after the sample is in place:
+        self.sequence += 1
+        COUNTER.pack_into(self.buf, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        # The writer owns the block, so it also removes it
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class TrajectoryReader:
+    """Reader for a SharedTrajectoryBuffer, usually in another process
+
+    Example:
+    --------
+    >>> reader = TrajectoryReader('centerout_traj')
+    >>> samples, sequence = reader.latest(100)
+    >>> samples, sequence = reader.since(sequence)
+    """
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Before Python 3.13, attaching registers the block with this
+        # process's resource tracker, which would unlink it on exit.
+        try:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except Exception:
+            pass
+        self.buf = self.shm.buf
+        self.capacity = HEADER.unpack_from(self.buf, 0)[3]
+
+    def header(self):
+        # (sequence, trial number, trial start sequence, capacity)
+        return HEADER.unpack_from(self.buf, 0)
+
+    def _read(self, first, last):
+        # Copy samples [first, last); returns None if they were overwritten
+        samples = []
+        for sequence in range(first, last):
+            offset = HEADER.size + (sequence % self.capacity) * SAMPLE.size
+            samples.append(SAMPLE.unpack_from(self.buf, offset))
+        now = COUNTER.unpack_from(self.buf, SEQUENCE_OFFSET)[0]
+        # (>= because the writer may be half-way through the next slot)
+        if now - first >= self.capacity:
+            return None
+        return samples
+
+    def since(self, sequence):
+        """Samples written after `sequence`
+
+        Returns
+        -------
+        (samples, sequence) : (list of tuples, int)
+            The samples, and the sequence number to pass next time. If the
+            reader fell more than a full ring behind, only the samples
+            still in the buffer are returned.
+        """
+        while True:
+            last = COUNTER.unpack_from(self.buf, SEQUENCE_OFFSET)[0]
+            first = max(sequence, last - self.capacity + 1)
+            samples = self._read(first, last)
+            if samples is not None:
+                return samples, last
+            # The writer lapped us mid-copy; try again from further on.
+            sequence = last
+
+    def latest(self, count):
+        # The most recent `count` samples (fewer if not available yet)
+        last = COUNTER.unpack_from(self.buf, SEQUENCE_OFFSET)[0]
+        return self.since(max(0, last - count))
+
+    def currentTrial(self):
+        # All samples of the trial being run right now
+        sequence, trial, start, _ = self.header()
+        samples, sequence = self.since(start)
+        return trial, samples, sequence
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
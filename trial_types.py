@@ -0,0 +1,190 @@
+# Table-driven trial state machines.
+#
+# A trial type builds, once per trial, two tables:
+#   transitions: {state: (condition, next_state)}
+#   entry: {state: action}
+# condition() returns True when the current state is done; action() runs
+# on entering a state. Thresholds (fractions of this trial's target
+# distance, hold times, ...) are worked out in build() and captured by the
+# conditions, so the loop in runTrial only calls the current condition and
+# never does arithmetic on trial parameters. New trial types subclass
+# TrialType and register in TRIAL_TYPES; runTrial doesn't change.
+from abc import ABC, abstractmethod
+import math
+
+from spatial_index import GridIndex
+
+#States:
+STARTING = 0
+WAITING = 1
+WAIT_FOR_RT = 3
+MOVING_EARLY = 4
+MOVING_MIDPOINT = 5
+MOVING = 10
+FEEDBACK = 20
+FINISHED = 99
+
+
+def nothing():
+    # entry action for states that don't need one
+    pass
+
+
+class TrialType(ABC):
+    """Base class for trial types
+
+    Subclasses implement build(). The trial always starts in STARTING and
+    is over once it enters FINISHED (which needs no transition).
+    """
+    # whether the trial's own target (targetX, targetY) is drawn
+    showTarget = True
+
+    @abstractmethod
+    def build(self, exp, trial, objects):
+        """Build the tables for one trial
+
+        Parameters
+        ----------
+        exp : Adaptation_Experiment
+            The running experiment (cursor, timer, graphics flags).
+
+        trial : dict
+            This trial's data dictionary; entry actions record into it.
+            This may be the trial after the one currently running, so
+            build() must not change anything the running trial uses.
+
+        objects : list
+            Extra objects to draw with the target, appended as
+            (color, (x, y), radius).
+
+        Returns
+        -------
+        (transitions, entry) : (dict, dict)
+            See the top of this module.
+        """
+
+
+class CenterOutTrial(TrialType):
+    """Hold in the start circle, then reach out past the target distance
+
+    Positions are recorded at 1/4, 1/2 and all of this trial's target
+    distance, followed by feedbackTime seconds of endpoint feedback.
+    """
+    def build(self, exp, trial, objects):
+        cursor = exp.cursor
+        timer = exp.timer
+        fixRad = exp.fixRad
+        holdTime = exp.holdTime
+        feedbackTime = exp.feedbackTime
+        earlyDistance = trial['targetDistance'] / 4.0
+        midpointDistance = trial['targetDistance'] / 2.0
+        finalDistance = trial['targetDistance']
+
+        def recordPosition(name):
+            trial[name + 'Time'] = timer[2]
+            trial[name + 'X'] = cursor.CurrentX
+            trial[name + 'Y'] = cursor.CurrentY
+            trial[name + 'Angle'] = \
+                math.atan2(cursor.CurrentY, cursor.CurrentX)
+
+        def enterWaiting():
+            timer.reset(2)
+
+        def enterWaitForRT():
+            timer.reset(2)
+            exp.targetOn = True
+
+        def enterMovingEarly():
+            trial['reactionTime'] = timer[2]
+            timer.reset(2)
+
+        def enterMovingMidpoint():
+            recordPosition('early')
+
+        def enterMoving():
+            recordPosition('midpoint')
+
+        def enterFeedback():
+            trial['movementTime'] = timer[2]
+            trial['finalX'] = cursor.CurrentX
+            trial['finalY'] = cursor.CurrentY
+            trial['finalAngle'] = math.atan2(cursor.CurrentY, cursor.CurrentX)
+            trial['feedbackX'] = cursor.DisplayX
+            trial['feedbackY'] = cursor.DisplayY
+            timer.reset(2)
+            exp.feedbackOn = True
+
+        transitions = {
+            # wait for the cursor to be in the fixation spot:
+            STARTING: (lambda: cursor.VisualDisplacement < fixRad, WAITING),
+            # wait an appropriate amount of time in the fixation spot:
+            WAITING: (lambda: timer[2] >= holdTime, WAIT_FOR_RT),
+            # wait for subject to start moving:
+            WAIT_FOR_RT: (
+                lambda: cursor.VisualDisplacement >= fixRad, MOVING_EARLY),
+            # wait for the cursor to cross 1/4 of target distance:
+            MOVING_EARLY: (
+                lambda: cursor.VisualDisplacement >= earlyDistance,
+                MOVING_MIDPOINT),
+            # wait for the cursor to cross 1/2 of target distance:
+            MOVING_MIDPOINT: (
+                lambda: cursor.VisualDisplacement >= midpointDistance,
+                MOVING),
+            # wait for the cursor to cross target distance:
+            MOVING: (
+                lambda: cursor.VisualDisplacement >= finalDistance,
+                FEEDBACK),
+            FEEDBACK: (lambda: timer[2] >= feedbackTime, FINISHED),
+            }
+        entry = {
+            WAITING: enterWaiting,
+            WAIT_FOR_RT: enterWaitForRT,
+            MOVING_EARLY: enterMovingEarly,
+            MOVING_MIDPOINT: enterMovingMidpoint,
+            MOVING: enterMoving,
+            FEEDBACK: enterFeedback,
+            FINISHED: nothing,
+            }
+        return transitions, entry
+
+
+class ChoiceTrial(CenterOutTrial):
+    """Reach to any one of numTargets targets shown together
+
+    All targets sit on a ring at this trial's target distance. The reach
+    ends when the cursor lands on one of them (chosenAngle records which)
+    or passes the ring without touching any (chosenAngle stays -1). Hit
+    testing goes through a GridIndex, so each sample costs the same
+    however many targets there are. The trial's own target isn't drawn;
+    it might not be on the ring, and couldn't be chosen if it weren't.
+    """
+    showTarget = False
+
+    def build(self, exp, trial, objects):
+        transitions, entry = CenterOutTrial.build(self, exp, trial, objects)
+        cursor = exp.cursor
+        index = GridIndex(2 * exp.targetRadius)
+        for i in range(exp.numTargets):
+            angle = i * 360.0 / exp.numTargets
+            position = exp.pol2rect(trial['targetDistance'], angle)
+            index.insert(position[0], position[1], exp.targetRadius, angle)
+            objects.append((exp.targetColor, position, exp.targetRadius))
+        missDistance = trial['targetDistance'] + exp.targetRadius
+
+        def reached():
+            choice = index.hit(cursor.DisplayX, cursor.DisplayY)
+            if choice is not None:
+                trial['chosenAngle'] = choice
+                return True
+            return cursor.VisualDisplacement >= missDistance
+
+        transitions[MOVING] = (reached, FEEDBACK)
+        return transitions, entry
+
+
+# Trial types by name, as given in a target file's "trial_type" column:
+TRIAL_TYPES = {
+    'center_out': CenterOutTrial(),
+    'choice': ChoiceTrial(),
+    }
+DEFAULT_TRIAL_TYPE = 'center_out'